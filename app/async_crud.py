@@ -0,0 +1,838 @@
+"""CRUD classes the async route handlers use, one class per table or feature"""
+from database import adb, after_commit
+from scenarios import (
+    get_cached_scenario, cache_scenario, invalidate_scenario,
+    ScenarioNode, split_scenario, assemble_scenario, strip_subtrees
+)
+import json
+from datetime import datetime
+from auth import invalidate_principal
+from passwords import get_password_hash_async
+import uuid
+from typing import List, Dict, Optional
+
+# Users per statement in UserCRUD.apply_trait_deltas_batch
+TRAIT_DELTA_BATCH_SIZE = 500
+
+# Adds per-user deltas to trait_profile and clamps to 0-100 in one statement,
+# so concurrent updates cannot overwrite each other. The parameter is a JSON
+# array of {"userid": ..., "deltas": {trait: delta}}; only traits already in
+# the profile change and a "*" delta is added to every trait.
+APPLY_TRAIT_DELTAS_SQL = """
+    UPDATE user_info u
+    JOIN JSON_TABLE(%s, '$[*]' COLUMNS (
+        userid INT PATH '$.userid',
+        deltas JSON PATH '$.deltas'
+    )) d ON d.userid = u.userid
+    SET u.trait_profile = (
+        SELECT JSON_OBJECTAGG(k.trait, LEAST(100, GREATEST(0,
+            CAST(JSON_EXTRACT(u.trait_profile, CONCAT('$."', k.trait, '"')) AS SIGNED)
+            + COALESCE(CAST(JSON_EXTRACT(d.deltas, CONCAT('$."', k.trait, '"')) AS SIGNED), 0)
+            + COALESCE(CAST(JSON_EXTRACT(d.deltas, '$."*"') AS SIGNED), 0)
+        )))
+        FROM JSON_TABLE(JSON_KEYS(u.trait_profile), '$[*]' COLUMNS (trait VARCHAR(64) PATH '$')) k
+    )
+    WHERE JSON_LENGTH(u.trait_profile) > 0
+"""
+
+class UserCRUD:
+    @staticmethod
+    async def create_user(user_data):
+        # Hash before touching the database, so no pooled connection or open
+        # transaction waits on the password worker pool
+        hashed_password = await get_password_hash_async(user_data.password)
+        
+        async with adb.get_cursor() as (cursor, connection):
+            # Check if username or email already exists
+            await cursor.execute("""
+                SELECT userid FROM user_info 
+                WHERE username = %s OR email = %s
+            """, (user_data.username, user_data.email))
+            
+            if await cursor.fetchone():
+                return {"error": "Username or email already exists"}
+            
+            # Create new user
+            await cursor.execute("""
+                INSERT INTO user_info 
+                (username, email, hashpassword, trait_profile, game_played, game_history, is_active) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, (
+                user_data.username,
+                user_data.email,
+                hashed_password,
+                json.dumps(user_data.trait_profile),
+                0,
+                json.dumps({}),
+                True
+            ))
+            
+            await connection.commit()
+            return {"userid": cursor.lastrowid, "message": "User created successfully"}
+    
+    @staticmethod
+    async def get_user(user_id: int):
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("""
+                SELECT userid, username, email, trait_profile, game_played, 
+                       created_at, is_active
+                FROM user_info 
+                WHERE userid = %s
+            """, (user_id,))
+            
+            user = await cursor.fetchone()
+            if user:
+                user['trait_profile'] = json.loads(user['trait_profile']) if user['trait_profile'] else {}
+                user['game_history'] = await SessionHistoryCRUD.get_user_history(user_id)
+            return user
+    
+    @staticmethod
+    async def update_user(user_id: int, update_data):
+        if update_data.trait_profile:
+            # Buffered deltas were relative to the profile being replaced
+            # (imported here, write_behind imports this module)
+            from write_behind import write_buffer
+            await write_buffer.discard_trait_deltas(user_id)
+        
+        async with adb.get_cursor() as (cursor, connection):
+            updates = []
+            values = []
+            
+            if update_data.email:
+                updates.append("email = %s")
+                values.append(update_data.email)
+            
+            if update_data.trait_profile:
+                updates.append("trait_profile = %s")
+                values.append(json.dumps(update_data.trait_profile))
+            
+            if not updates:
+                return {"message": "No updates provided"}
+            
+            values.append(user_id)
+            query = f"UPDATE user_info SET {', '.join(updates)} WHERE userid = %s"
+            await cursor.execute(query, values)
+            await connection.commit()
+            invalidate_principal(user_id)
+            after_commit(lambda: invalidate_principal(user_id))
+            
+            return {"message": "User updated successfully"}
+    
+    @staticmethod
+    async def update_user_game_history(user_id: int, game_history_data: dict):
+        """Store each session_<id> entry of a game history dict in session_history"""
+        for key, history in game_history_data.items():
+            if key.startswith("session_") and key[len("session_"):].isdigit():
+                await SessionHistoryCRUD.save_session_history(user_id, int(key[len("session_"):]), history)
+        return {"message": "Game history updated successfully"}
+    
+    @staticmethod
+    async def update_user_traits(user_id: int, trait_updates: dict):
+        """Update specific user traits based on choices"""
+        if await UserCRUD.apply_trait_deltas(user_id, trait_updates):
+            return {"message": "Traits updated successfully"}
+        return {"error": "User not found or trait profile is empty"}
+    
+    @staticmethod
+    async def apply_trait_deltas(user_id: int, deltas: dict):
+        """Add deltas to a user's traits in one statement, True if the user has a trait profile"""
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute(APPLY_TRAIT_DELTAS_SQL, (json.dumps([{"userid": user_id, "deltas": deltas}]),))
+            updated = cursor.rowcount > 0
+            if not updated:
+                # rowcount is 0 too when every trait was already clamped
+                await cursor.execute("""
+                    SELECT 1 FROM user_info 
+                    WHERE userid = %s AND JSON_LENGTH(trait_profile) > 0
+                """, (user_id,))
+                updated = await cursor.fetchone() is not None
+            await connection.commit()
+            return updated
+    
+    @staticmethod
+    async def apply_trait_deltas_batch(deltas_by_user: Dict[int, dict], batch_size: int = TRAIT_DELTA_BATCH_SIZE):
+        """Apply {user_id: deltas} for many users (backfills, replays), returns rows changed"""
+        items = [{"userid": user_id, "deltas": deltas} for user_id, deltas in deltas_by_user.items()]
+        changed = 0
+        async with adb.get_cursor() as (cursor, connection):
+            for start in range(0, len(items), batch_size):
+                await cursor.execute(APPLY_TRAIT_DELTAS_SQL, (json.dumps(items[start:start + batch_size]),))
+                changed += cursor.rowcount
+            await connection.commit()
+        return changed
+    
+    @staticmethod
+    async def delete_user(user_id: int):
+        async with adb.get_cursor() as (cursor, connection):
+            # Soft delete - just mark as inactive
+            await cursor.execute("""
+                UPDATE user_info 
+                SET is_active = FALSE 
+                WHERE userid = %s
+            """, (user_id,))
+            await connection.commit()
+            invalidate_principal(user_id)
+            after_commit(lambda: invalidate_principal(user_id))
+            return {"message": "User deleted successfully"}
+    
+    @staticmethod
+    async def get_all_users(skip: int = 0, limit: int = 100):
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("""
+                SELECT userid, username, email, game_played, created_at, is_active
+                FROM user_info 
+                WHERE is_active = TRUE
+                LIMIT %s OFFSET %s
+            """, (limit, skip))
+            return await cursor.fetchall()
+    
+    @staticmethod
+    async def increment_games_played(user_id: int):
+        """Increment the games_played counter for a user"""
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                UPDATE user_info
+                SET game_played = game_played + 1
+                WHERE userid = %s
+            """, (user_id,))
+            await connection.commit()
+            return {"message": "Games played counter incremented"}
+    
+    @staticmethod
+    async def increment_games_played_batch(counts: Dict[int, int]):
+        """Add {user_id: games} to the games_played counters in one statement"""
+        if not counts:
+            return 0
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                UPDATE user_info u
+                JOIN JSON_TABLE(%s, '$[*]' COLUMNS (
+                    userid INT PATH '$.userid',
+                    games INT PATH '$.games'
+                )) d ON d.userid = u.userid
+                SET u.game_played = u.game_played + d.games
+            """, (json.dumps([{"userid": user_id, "games": games} for user_id, games in counts.items()]),))
+            await connection.commit()
+            return cursor.rowcount
+
+class SessionCRUD:
+    @staticmethod
+    async def create_session(user_id: int, mode: str, scenario_id: Optional[int] = None):
+        async with adb.get_cursor() as (cursor, connection):
+            if mode == "learn" and scenario_id is None:
+                return {"error": "scenario_id is required for learn mode"}
+            
+            await cursor.execute("""
+                INSERT INTO game_session (user_id, mode, scenario_id) 
+                VALUES (%s, %s, %s)
+            """, (user_id, mode, scenario_id))
+            
+            await connection.commit()
+            return {
+                "session_id": cursor.lastrowid,
+                "message": "Session created successfully"
+            }
+    
+    @staticmethod
+    async def get_session(session_id: int):
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("""
+                SELECT * FROM game_session 
+                WHERE session_id = %s
+            """, (session_id,))
+            return await cursor.fetchone()
+    
+    @staticmethod
+    async def update_session(session_id: int, ended_at: datetime, is_completed: bool):
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                UPDATE game_session 
+                SET ended_at = %s, is_completed = %s 
+                WHERE session_id = %s
+            """, (ended_at, is_completed, session_id))
+            await connection.commit()
+            return {"message": "Session updated"}
+    
+    @staticmethod
+    async def get_user_sessions(user_id: int, mode: Optional[str] = None):
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            query = "SELECT * FROM game_session WHERE user_id = %s"
+            params = [user_id]
+            
+            if mode:
+                query += " AND mode = %s"
+                params.append(mode)
+            
+            query += " ORDER BY started_at DESC"
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
+    
+    @staticmethod
+    async def get_session_with_details(session_id: int):
+        """Get session with all related details for game history"""
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            # Get session info
+            await cursor.execute("""
+                SELECT gs.*, u.username 
+                FROM game_session gs
+                JOIN user_info u ON gs.user_id = u.userid
+                WHERE gs.session_id = %s
+            """, (session_id,))
+            
+            session = await cursor.fetchone()
+            if not session:
+                return None
+            
+            # Get choices
+            await cursor.execute("""
+                SELECT * FROM user_choices
+                WHERE session_id = %s
+                ORDER BY depth, created_at
+            """, (session_id,))
+            
+            session['choices'] = await cursor.fetchall()
+            
+            return session
+
+class ChoiceCRUD:
+    @staticmethod
+    async def record_choice(session_id: int, depth: int, choice_id: str, trait_impact: str):
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                INSERT INTO user_choices (session_id, depth, choice_id, trait_impact)
+                VALUES (%s, %s, %s, %s)
+            """, (session_id, depth, choice_id, trait_impact))
+            await connection.commit()
+            return {"message": "Choice recorded"}
+    
+    @staticmethod
+    async def get_session_choices(session_id: int):
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("""
+                SELECT * FROM user_choices 
+                WHERE session_id = %s 
+                ORDER BY depth
+            """, (session_id,))
+            return await cursor.fetchall()
+    
+    @staticmethod
+    async def get_choice_details(session_id: int, depth: int):
+        """Get detailed information about a specific choice"""
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("""
+                SELECT * FROM user_choices 
+                WHERE session_id = %s AND depth = %s
+            """, (session_id, depth))
+            return await cursor.fetchone()
+    
+    @staticmethod
+    async def get_choice_impacts(session_id: int):
+        """Get trait impacts from all choices in a session"""
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("""
+                SELECT trait_impact, COUNT(*) as count
+                FROM user_choices 
+                WHERE session_id = %s
+                GROUP BY trait_impact
+            """, (session_id,))
+            return await cursor.fetchall()
+
+class ScenarioCRUD:
+    @staticmethod
+    async def get_scenario(scenario_id: int):
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("""
+                SELECT * FROM scenario 
+                WHERE scenario_id = %s
+            """, (scenario_id,))
+            
+            result = await cursor.fetchone()
+        if result:
+            if result['info']:
+                result['info'] = json.loads(result['info'])
+            else:
+                result['info'] = await ScenarioCRUD.assemble_from_nodes(scenario_id)
+        return result
+    
+    @staticmethod
+    async def get_scenario_version(scenario_id: int):
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                SELECT version FROM scenario 
+                WHERE scenario_id = %s
+            """, (scenario_id,))
+            
+            result = await cursor.fetchone()
+            return result[0] if result else None
+    
+    @staticmethod
+    async def get_compiled_scenario(scenario_id: int):
+        """Parsed scenario tree from the process-wide cache, loaded on a version miss"""
+        version = await ScenarioCRUD.get_scenario_version(scenario_id)
+        if version is None:
+            return None
+        
+        compiled = get_cached_scenario(scenario_id, version)
+        if compiled is not None:
+            return compiled
+        
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                SELECT info, version FROM scenario 
+                WHERE scenario_id = %s
+            """, (scenario_id,))
+            
+            result = await cursor.fetchone()
+        if not result:
+            return None
+        
+        raw_info, version = result
+        if raw_info:
+            info = json.loads(raw_info)
+        else:
+            info = await ScenarioCRUD.assemble_from_nodes(scenario_id)
+        return cache_scenario(scenario_id, version, info, len(raw_info or json.dumps(info)))
+    
+    @staticmethod
+    async def get_scenario_node(scenario_id: int, path: str):
+        """
+        One node of a scenario with its subtrees replaced by next_path
+        references. Served from the compiled tree when it is cached,
+        otherwise read from its own scenario_node row.
+        """
+        nodes = await ScenarioCRUD.get_scenario_nodes(scenario_id, [path])
+        return nodes.get(path) if nodes is not None else None
+    
+    @staticmethod
+    async def get_scenario_nodes(scenario_id: int, paths: List[str]):
+        """{path: node} for the paths that exist, read in one query; None if the scenario does not exist"""
+        if not paths:
+            # Nothing to look up, and "IN ()" is a syntax error
+            return {}
+        version = await ScenarioCRUD.get_scenario_version(scenario_id)
+        if version is None:
+            return None
+        
+        compiled = get_cached_scenario(scenario_id, version)
+        if compiled is None:
+            placeholders = ", ".join(["%s"] * len(paths))
+            async with adb.get_cursor() as (cursor, connection):
+                await cursor.execute(f"""
+                    SELECT path, node, subtree_bytes FROM scenario_node 
+                    WHERE scenario_id = %s AND path IN ({placeholders})
+                """, (scenario_id, *paths))
+                
+                rows = await cursor.fetchall()
+            if rows:
+                return {path: ScenarioNode.from_stored(path, json.loads(node), subtree_bytes)
+                        for path, node, subtree_bytes in rows}
+            
+            # Not split into rows yet (or only invalid paths): use the whole tree
+            compiled = await ScenarioCRUD.get_compiled_scenario(scenario_id)
+            if compiled is None:
+                return None
+        return {path: compiled.node_at(path) for path in paths if compiled.node_at(path) is not None}
+    
+    @staticmethod
+    async def assemble_from_nodes(scenario_id: int):
+        """Rebuild a scenario document from its scenario_node rows"""
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                SELECT path, node FROM scenario_node 
+                WHERE scenario_id = %s
+            """, (scenario_id,))
+            
+            rows = await cursor.fetchall()
+            return assemble_scenario({path: json.loads(node) for path, node in rows})
+    
+    @staticmethod
+    async def _store_nodes(cursor, scenario_id: int, scenario_data):
+        """Replace the scenario_node rows of a scenario with the nodes of scenario_data"""
+        await cursor.execute("DELETE FROM scenario_node WHERE scenario_id = %s", (scenario_id,))
+        await cursor.executemany("""
+            INSERT INTO scenario_node (scenario_id, path, depth, node, subtree_bytes)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [(scenario_id, path, depth, json.dumps(node), subtree_bytes)
+              for path, depth, node, subtree_bytes in split_scenario(scenario_data)])
+    
+    @staticmethod
+    async def store_scenario_nodes(scenario_id: int, scenario_data):
+        """Split a scenario document into scenario_node rows"""
+        async with adb.get_cursor() as (cursor, connection):
+            await ScenarioCRUD._store_nodes(cursor, scenario_id, scenario_data)
+            await connection.commit()
+            return {"scenario_id": scenario_id}
+    
+    @staticmethod
+    async def create_scenario(scenario_data):
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                INSERT INTO scenario (info) 
+                VALUES (%s)
+            """, (json.dumps(scenario_data),))
+            scenario_id = cursor.lastrowid
+            await ScenarioCRUD._store_nodes(cursor, scenario_id, scenario_data)
+            await connection.commit()
+            return {"scenario_id": scenario_id}
+    
+    @staticmethod
+    async def update_scenario(scenario_id: int, scenario_data):
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                UPDATE scenario 
+                SET info = %s, version = version + 1 
+                WHERE scenario_id = %s
+            """, (json.dumps(scenario_data), scenario_id))
+            await ScenarioCRUD._store_nodes(cursor, scenario_id, scenario_data)
+            await connection.commit()
+            invalidate_scenario(scenario_id)
+            after_commit(lambda: invalidate_scenario(scenario_id))
+            return {"message": "Scenario updated"}
+    
+    @staticmethod
+    async def update_scenario_node(scenario_id: int, path: str, node_data):
+        """
+        Replace the content of one node, keeping its links to child nodes.
+        Only that row is rewritten; scenario.info is cleared and reassembled
+        from the rows when the whole document is next needed.
+        """
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                SELECT node FROM scenario_node 
+                WHERE scenario_id = %s AND path = %s
+                FOR UPDATE
+            """, (scenario_id, path))
+            
+            result = await cursor.fetchone()
+            if not result:
+                return None
+            
+            existing = json.loads(result[0])
+            child_paths = {c["choice_id"]: c["next_path"] for c in existing.get("choices", []) if "next_path" in c}
+            await cursor.execute("""
+                UPDATE scenario_node 
+                SET node = %s 
+                WHERE scenario_id = %s AND path = %s
+            """, (json.dumps(strip_subtrees(node_data, child_paths)), scenario_id, path))
+            await cursor.execute("""
+                UPDATE scenario 
+                SET info = NULL, version = version + 1 
+                WHERE scenario_id = %s
+            """, (scenario_id,))
+            await connection.commit()
+            invalidate_scenario(scenario_id)
+            after_commit(lambda: invalidate_scenario(scenario_id))
+            return {"message": "Scenario node updated"}
+    
+    @staticmethod
+    async def delete_scenario(scenario_id: int):
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                DELETE FROM scenario 
+                WHERE scenario_id = %s
+            """, (scenario_id,))
+            await connection.commit()
+            invalidate_scenario(scenario_id)
+            after_commit(lambda: invalidate_scenario(scenario_id))
+            return {"message": "Scenario deleted"}
+    
+    @staticmethod
+    async def list_scenarios():
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("SELECT scenario_id FROM scenario")
+            return await cursor.fetchall()
+    
+    @staticmethod
+    async def get_scenario_metadata(scenario_id: int):
+        """Get the metadata for a scenario"""
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("""
+                SELECT * FROM scenario_metadata
+                WHERE scenario_id = %s
+            """, (scenario_id,))
+            return await cursor.fetchone()
+
+class GeneratedScenarioCRUD:
+    @staticmethod
+    async def save_generated_scenario(session_id: int, depth: int, scenario_json: dict, prompt_version: Optional[str] = None):
+        async with adb.get_cursor() as (cursor, connection):
+            # The first scenario stored for a depth wins, later ones get its id back
+            await cursor.execute("""
+                INSERT INTO generated_scenarios (session_id, depth, scenario_json, prompt_version)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+            """, (session_id, depth, json.dumps(scenario_json), prompt_version))
+            await connection.commit()
+            if cursor.rowcount == 1:
+                return {"id": cursor.lastrowid}
+            return {"id": cursor.lastrowid, "duplicate": True}
+    
+    @staticmethod
+    async def get_generated_scenario(session_id: int, depth: int):
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("""
+                SELECT * FROM generated_scenarios
+                WHERE session_id = %s AND depth = %s
+            """, (session_id, depth))
+            
+            result = await cursor.fetchone()
+            if result:
+                result['scenario_json'] = json.loads(result['scenario_json'])
+            return result
+    
+    @staticmethod
+    async def get_all_generated_scenarios(session_id: int):
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("""
+                SELECT * FROM generated_scenarios
+                WHERE session_id = %s
+                ORDER BY depth
+            """, (session_id,))
+            
+            scenarios = await cursor.fetchall()
+            for scenario in scenarios:
+                scenario['scenario_json'] = json.loads(scenario['scenario_json'])
+            return scenarios
+
+class SessionHistoryCRUD:
+    @staticmethod
+    async def save_session_history(user_id: int, session_id: int, history: dict):
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                INSERT INTO session_history (user_id, session_id, history)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE history = VALUES(history)
+            """, (user_id, session_id, json.dumps(history)))
+            await connection.commit()
+            return {"message": "Session history saved"}
+    
+    @staticmethod
+    async def get_session_history(user_id: int, session_id: int):
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                SELECT history FROM session_history
+                WHERE user_id = %s AND session_id = %s
+            """, (user_id, session_id))
+            
+            result = await cursor.fetchone()
+            return json.loads(result[0]) if result and result[0] else None
+    
+    @staticmethod
+    async def get_user_history(user_id: int):
+        """All session histories of a user in the legacy {"session_<id>": history} shape"""
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                SELECT session_id, history FROM session_history
+                WHERE user_id = %s
+                ORDER BY session_id
+            """, (user_id,))
+            
+            return {f"session_{session_id}": json.loads(history) for session_id, history in await cursor.fetchall()}
+
+class AnalyticsCRUD:
+    @staticmethod
+    async def get_user_stats(user_id: int):
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            # Get user data
+            await cursor.execute("""
+                SELECT game_played, trait_profile 
+                FROM user_info 
+                WHERE userid = %s
+            """, (user_id,))
+            user_data = await cursor.fetchone()
+            
+            # Get session stats
+            await cursor.execute("""
+                SELECT mode, COUNT(*) as count, 
+                       SUM(is_completed) as completed,
+                       AVG(TIMESTAMPDIFF(MINUTE, started_at, ended_at)) as avg_duration
+                FROM game_session 
+                WHERE user_id = %s 
+                GROUP BY mode
+            """, (user_id,))
+            session_stats = await cursor.fetchall()
+            
+            # Get trait progression
+            await cursor.execute("""
+                SELECT uc.trait_impact, COUNT(*) as count
+                FROM user_choices uc
+                JOIN game_session gs ON uc.session_id = gs.session_id
+                WHERE gs.user_id = %s
+                GROUP BY uc.trait_impact
+            """, (user_id,))
+            trait_impacts = await cursor.fetchall()
+            
+            return {
+                "user_data": user_data,
+                "session_stats": session_stats,
+                "trait_impacts": trait_impacts
+            }
+    
+    @staticmethod
+    async def get_leaderboard(limit: int = 10):
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("""
+                SELECT u.userid, u.username, u.game_played,
+                       COUNT(DISTINCT gs.session_id) as total_sessions,
+                       SUM(gs.is_completed) as completed_sessions,
+                       u.trait_profile
+                FROM user_info u
+                LEFT JOIN game_session gs ON u.userid = gs.user_id
+                WHERE u.is_active = TRUE
+                GROUP BY u.userid
+                ORDER BY u.game_played DESC, completed_sessions DESC
+                LIMIT %s
+            """, (limit,))
+            
+            leaderboard = await cursor.fetchall()
+            for entry in leaderboard:
+                if entry['trait_profile']:
+                    trait_profile = json.loads(entry['trait_profile'])
+                    # Find dominant trait
+                    if trait_profile:
+                        dominant_trait = max(trait_profile.items(), key=lambda x: x[1])
+                        entry['dominant_trait'] = dominant_trait[0]
+                        entry['dominant_trait_value'] = dominant_trait[1]
+                del entry['trait_profile']
+            
+            return leaderboard
+    
+    @staticmethod
+    async def get_choice_analytics(scenario_id: Optional[int] = None):
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            query = """
+                SELECT uc.depth, uc.choice_id, uc.trait_impact, COUNT(*) as count
+                FROM user_choices uc
+                JOIN game_session gs ON uc.session_id = gs.session_id
+            """
+            params = []
+            
+            if scenario_id:
+                query += " WHERE gs.scenario_id = %s"
+                params.append(scenario_id)
+            
+            query += " GROUP BY uc.depth, uc.choice_id, uc.trait_impact"
+            query += " ORDER BY uc.depth, uc.choice_id"
+            
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
+    
+    @staticmethod
+    async def record_session_analytics(session_id: int, analytics_data: dict):
+        """Record analytics for a completed session"""
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
+                INSERT INTO session_analytics 
+                (session_id, total_choices, average_response_time, trait_focus, trait_changes, session_score)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (
+                session_id,
+                analytics_data.get("total_choices", 0),
+                analytics_data.get("average_response_time", 0),
+                analytics_data.get("trait_focus", ""),
+                json.dumps(analytics_data.get("trait_changes", {})),
+                analytics_data.get("session_score", 0)
+            ))
+            await connection.commit()
+            return {"id": cursor.lastrowid}
+    
+    @staticmethod
+    async def get_user_progress_over_time(user_id: int):
+        """Get user trait progress over time through multiple sessions"""
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("""
+                SELECT gs.session_id, gs.started_at, gs.ended_at, 
+                       JSON_EXTRACT(sh.history, '$.results.trait_changes') as trait_changes
+                FROM game_session gs
+                LEFT JOIN session_history sh ON sh.user_id = gs.user_id AND sh.session_id = gs.session_id
+                WHERE gs.user_id = %s AND gs.is_completed = TRUE
+                ORDER BY gs.started_at
+            """, (user_id,))
+            
+            return await cursor.fetchall()
+
+class AchievementCRUD:
+    @staticmethod
+    async def list_achievements():
+        """List all available achievements"""
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("SELECT * FROM achievements")
+            return await cursor.fetchall()
+    
+    @staticmethod
+    async def get_user_achievements(user_id: int):
+        """Get all achievements for a user"""
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            await cursor.execute("""
+                SELECT a.*, ua.unlocked_at
+                FROM achievements a
+                JOIN user_achievements ua ON a.achievement_id = ua.achievement_id
+                WHERE ua.user_id = %s
+                ORDER BY ua.unlocked_at
+            """, (user_id,))
+            return await cursor.fetchall()
+    
+    @staticmethod
+    async def unlock_achievement(user_id: int, achievement_id: int):
+        """Unlock an achievement for a user"""
+        async with adb.get_cursor() as (cursor, connection):
+            # Check if already unlocked
+            await cursor.execute("""
+                SELECT * FROM user_achievements
+                WHERE user_id = %s AND achievement_id = %s
+            """, (user_id, achievement_id))
+            
+            if await cursor.fetchone():
+                return {"message": "Achievement already unlocked"}
+            
+            # Unlock achievement
+            await cursor.execute("""
+                INSERT INTO user_achievements (user_id, achievement_id)
+                VALUES (%s, %s)
+            """, (user_id, achievement_id))
+            await connection.commit()
+            return {"message": "Achievement unlocked"}
+    
+    @staticmethod
+    async def check_achievement_eligibility(user_id: int):
+        """Check if user is eligible for any new achievements"""
+        async with adb.get_cursor(dictionary=True) as (cursor, connection):
+            # Get user stats
+            await cursor.execute("""
+                SELECT game_played, trait_profile FROM user_info
+                WHERE userid = %s
+            """, (user_id,))
+            
+            user_stats = await cursor.fetchone()
+            if not user_stats:
+                return {"eligible_achievements": []}
+            
+            # Get completed sessions
+            await cursor.execute("""
+                SELECT COUNT(*) as completed_sessions FROM game_session
+                WHERE user_id = %s AND is_completed = TRUE
+            """, (user_id,))
+            
+            session_stats = await cursor.fetchone()
+            
+            # Get already unlocked achievements
+            await cursor.execute("""
+                SELECT achievement_id FROM user_achievements
+                WHERE user_id = %s
+            """, (user_id,))
+            
+            unlocked = [row["achievement_id"] for row in await cursor.fetchall()]
+            
+            # Check achievements based on criteria
+            await cursor.execute("""
+                SELECT * FROM achievements
+                WHERE achievement_id NOT IN (%s)
+            """, (",".join(map(str, unlocked)) if unlocked else "0"))
+            
+            eligible = []
+            for achievement in await cursor.fetchall():
+                # This is where you'd implement logic for checking eligibility
+                # based on achievement criteria and user stats
+                pass
+            
+            return {"eligible_achievements": eligible}
\ No newline at end of file
@@ -1,9 +1,11 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from database import db
+from database import db, adb, commit_now
+from cache import LRUCache
+from passwords import pwd_context, verify_password, get_password_hash, verify_password_async
 import os
+import time
 from dotenv import load_dotenv
 import json
 
@@ -15,13 +17,12 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Resolved principals keyed by the raw JWT, so repeated requests with the
+# same token skip both the decode and the user_info lookup
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
+principal_cache = LRUCache("principal", maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
 
 def authenticate_user(username: str, password: str):
     with db.get_cursor(dictionary=True) as (cursor, connection):
@@ -40,6 +41,26 @@ def authenticate_user(username: str, password: str):
             return False
         return user
 
+async def authenticate_user_async(username: str, password: str):
+    async with adb.get_cursor(dictionary=True) as (cursor, connection):
+        await cursor.execute("""
+            SELECT userid, username, email, hashpassword, is_active 
+            FROM user_info 
+            WHERE username = %s
+        """, (username,))
+        user = await cursor.fetchone()
+    
+    if not user:
+        return False
+    # Nothing was written; give the request's connection back before
+    # waiting on the password worker pool
+    await commit_now()
+    if not await verify_password_async(password, user['hashpassword']):
+        return False
+    if not user.get('is_active', True):
+        return False
+    return user
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -50,7 +71,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str):
+def _decode_token(token: str):
     credentials_exception = Exception("Could not validate credentials")
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -59,11 +80,19 @@ def get_current_user(token: str):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    return payload
+
+def _username_from_token(token: str):
+    return _decode_token(token)["sub"]
+
+def get_current_user(token: str):
+    credentials_exception = Exception("Could not validate credentials")
+    username = _username_from_token(token)
     
     with db.get_cursor(dictionary=True) as (cursor, connection):
         cursor.execute("""
             SELECT userid, username, email, trait_profile, game_played, 
-                   game_history, created_at, is_active
+                   created_at, is_active
             FROM user_info 
             WHERE username = %s
         """, (username,))
@@ -72,8 +101,62 @@ def get_current_user(token: str):
         if user is None:
             raise credentials_exception
         
-        # Parse JSON fields
+        # Parse JSON fields (game history lives in session_history and is loaded on demand)
         user['trait_profile'] = json.loads(user['trait_profile']) if user['trait_profile'] else {}
-        user['game_history'] = json.loads(user['game_history']) if user['game_history'] else {}
         
-        return user
\ No newline at end of file
+        return user
+
+async def get_current_user_async(token: str):
+    credentials_exception = Exception("Could not validate credentials")
+    username = _username_from_token(token)
+    
+    async with adb.get_cursor(dictionary=True) as (cursor, connection):
+        await cursor.execute("""
+            SELECT userid, username, email, trait_profile, game_played, 
+                   created_at, is_active
+            FROM user_info 
+            WHERE username = %s
+        """, (username,))
+        user = await cursor.fetchone()
+        
+        if user is None:
+            raise credentials_exception
+        
+        # Parse JSON fields (game history lives in session_history and is loaded on demand)
+        user['trait_profile'] = json.loads(user['trait_profile']) if user['trait_profile'] else {}
+        
+        return user
+
+async def get_principal_async(token: str):
+    """Just enough of the user to authorize a request: userid, username and is_active"""
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return dict(principal)
+    
+    credentials_exception = Exception("Could not validate credentials")
+    payload = _decode_token(token)
+    username = payload["sub"]
+    
+    async with adb.get_cursor(dictionary=True) as (cursor, connection):
+        await cursor.execute("""
+            SELECT userid, username, is_active
+            FROM user_info 
+            WHERE username = %s
+        """, (username,))
+        principal = await cursor.fetchone()
+        
+        if principal is None:
+            raise credentials_exception
+    
+    # Never keep a principal around longer than its token is valid
+    ttl = PRINCIPAL_CACHE_TTL
+    if payload.get("exp"):
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        principal_cache.set(token, dict(principal), ttl=ttl)
+    
+    return principal
+
+def invalidate_principal(user_id: int):
+    """Forget cached principals of a user, e.g. after it was updated or deactivated"""
+    principal_cache.invalidate_where(lambda token, principal: principal["userid"] == user_id)
@@ -0,0 +1,118 @@
+"""In-process caches with LRU eviction, optional TTL and hit/miss statistics"""
+import threading
+import time
+from collections import OrderedDict
+
+# name -> cache, for the stats endpoint
+_registry = {}
+
+class LRUCache:
+    """
+    Bounded LRU cache whose entries may also expire after a TTL.
+
+    Besides the entry count, the cache can be capped by total weight (e.g.
+    approximate bytes) when entries are stored with a weight.
+
+    Thread-safe so the same instance can be shared by async handlers and
+    code running in worker threads.
+    """
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = None, max_weight: int = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+
+        self._data = OrderedDict()  # key -> (value, expires_at, weight)
+        self._weight = 0
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+        _registry[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._misses += 1
+                return default
+
+            value, expires_at, weight = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self._weight -= weight
+                self._expirations += 1
+                self._misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None, weight: int = 1):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._weight -= previous[2]
+            if self.max_weight is not None and weight > self.max_weight:
+                # Would evict everything else and still not fit
+                return
+
+            self._data[key] = (value, expires_at, weight)
+            self._weight += weight
+            while len(self._data) > self.maxsize or (self.max_weight is not None and self._weight > self.max_weight):
+                _, (_, _, evicted_weight) = self._data.popitem(last=False)
+                self._weight -= evicted_weight
+                self._evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._weight -= entry[2]
+                self._invalidations += 1
+
+    def invalidate_where(self, predicate):
+        """Drop every entry for which predicate(key, value) is true, returns how many"""
+        with self._lock:
+            keys = [key for key, (value, _, _) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                self._weight -= self._data.pop(key)[2]
+            self._invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "weight": self._weight,
+                "max_weight": self.max_weight,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations
+            }
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in _registry.items()}
@@ -0,0 +1,92 @@
+"""
+Check that grow generations are not capped by the database pool.
+
+Run it against an API started with the offline LLM provider, so no tokens
+are spent:
+
+    LLM_PROVIDER=fake FAKE_LLM_LATENCY_MS=3000 uvicorn main:app
+    python check_generation_concurrency.py --concurrency 200
+
+Creates one grow session per concurrent request and fires all the
+POST /grow/scenario/{id}/generate calls at once, sampling /health/llm and
+/health/db while they run. Exits with status 1 if any request failed or if
+the peak number of LLM calls in flight did not exceed the async pool
+capacity (size + max_overflow).
+"""
+import argparse
+import asyncio
+import sys
+import time
+import httpx
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> str:
+    await client.post("/auth/register", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": password
+    })
+    response = await client.post("/auth/login", data={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+async def sample(client: httpx.AsyncClient, peaks: dict, stop: asyncio.Event):
+    while not stop.is_set():
+        llm = (await client.get("/health/llm")).json()
+        pool = (await client.get("/health/db")).json()["async_pool"]
+        peaks["llm_in_flight"] = max(peaks["llm_in_flight"], llm["in_flight"])
+        peaks["pool_checked_out"] = max(peaks["pool_checked_out"], pool["checked_out"])
+        peaks["pool_capacity"] = pool["size"] + pool["max_overflow"]
+        peaks["checkout_timeouts"] = pool["checkout_timeouts"]
+        await asyncio.sleep(0.1)
+
+async def run(api: str, concurrency: int, users: int):
+    run_id = int(time.time())
+    limits = httpx.Limits(max_connections=concurrency + 10)
+    async with httpx.AsyncClient(base_url=api, timeout=120, limits=limits) as client:
+        tokens = [await login(client, f"loadtest_{run_id}_{i}", "loadtest-password") for i in range(users)]
+
+        sessions = []
+        for i in range(concurrency):
+            headers = {"Authorization": f"Bearer {tokens[i % users]}"}
+            response = await client.post("/sessions/", json={"mode": "grow"}, headers=headers)
+            response.raise_for_status()
+            sessions.append((response.json()["session_id"], headers))
+
+        peaks = {"llm_in_flight": 0, "pool_checked_out": 0, "pool_capacity": 0, "checkout_timeouts": 0}
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample(client, peaks, stop))
+
+        async def generate(session_id: int, headers: dict):
+            response = await client.post(
+                f"/grow/scenario/{session_id}/generate",
+                json={"depth": 1, "previous_choices": [], "trait_focus": "bravery"},
+                headers=headers
+            )
+            return response.status_code
+
+        start = time.monotonic()
+        statuses = await asyncio.gather(*(generate(session_id, headers) for session_id, headers in sessions),
+                                        return_exceptions=True)
+        elapsed = time.monotonic() - start
+        stop.set()
+        await sampler
+
+    failed = [status for status in statuses if status != 200]
+    print(f"{concurrency} generations in {elapsed:.1f}s, {len(failed)} failed")
+    print(f"peak LLM calls in flight: {peaks['llm_in_flight']}")
+    print(f"peak pool connections checked out: {peaks['pool_checked_out']} of {peaks['pool_capacity']}")
+    print(f"pool checkout timeouts: {peaks['checkout_timeouts']}")
+    return not failed and peaks["llm_in_flight"] > peaks["pool_capacity"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--users", type=int, default=10)
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args.api, args.concurrency, args.users)):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
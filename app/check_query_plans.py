@@ -0,0 +1,286 @@
+"""
+EXPLAIN every query the CRUD layer runs and fail on full table scans.
+
+Run it against a scratch database that has been migrated (python migrate.py):
+
+    python check_query_plans.py --seed   # seed a realistic dataset first
+    python check_query_plans.py          # reuse previously seeded data
+
+The async CRUD methods the routes call (async_crud.py) and the principal
+lookup in auth.py are executed for real (including their writes) through a
+cursor that runs EXPLAIN on each SELECT/UPDATE/DELETE first. Exits with
+status 1 if any query does an unexpected full table scan.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from types import SimpleNamespace
+import aiomysql
+import async_crud as crud
+import auth
+from database import Database, AsyncDatabase
+
+# Queries that list or aggregate over a whole table on purpose
+EXPECTED_FULL_SCANS = {
+    "UserCRUD.get_all_users": "pages through all active users",
+    "ScenarioCRUD.list_scenarios": "lists every scenario",
+    "AnalyticsCRUD.get_leaderboard": "ranks every active user",
+    "AnalyticsCRUD.get_choice_analytics": "distribution over all choices",
+    "AchievementCRUD.list_achievements": "lists every achievement",
+    "AchievementCRUD.check_achievement_eligibility": "achievements is a small lookup table",
+}
+
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE")
+
+class ExplainingCursor:
+    """Cursor wrapper that records the EXPLAIN plan of every statement it runs"""
+    def __init__(self, cursor, connection, recorder):
+        self._cursor = cursor
+        self._connection = connection
+        self._recorder = recorder
+
+    async def execute(self, query, params=None):
+        if query.strip().upper().startswith(EXPLAINABLE):
+            explain_cursor = await self._connection.cursor(aiomysql.DictCursor)
+            try:
+                await explain_cursor.execute("EXPLAIN " + query, params)
+                self._recorder.record(query, await explain_cursor.fetchall())
+            finally:
+                await explain_cursor.close()
+        return await self._cursor.execute(query, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class ExplainingDatabase(AsyncDatabase):
+    def __init__(self):
+        super().__init__()
+        self.current_check = None
+        self.plans = []
+
+    def record(self, query, plan_rows):
+        self.plans.append((self.current_check, " ".join(query.split()), plan_rows))
+
+    @asynccontextmanager
+    async def get_cursor(self, dictionary=False):
+        async with super().get_cursor(dictionary=dictionary) as (cursor, connection):
+            yield ExplainingCursor(cursor, connection, self), connection
+
+def seed(users: int = 500, sessions_per_user: int = 4, choices_per_session: int = 5, scenarios: int = 50):
+    """Insert a deterministic dataset big enough for the optimizer to prefer indexes"""
+    rng = random.Random(42)
+    db = Database()
+    traits = ["focus", "bravery", "empathy", "honesty", "patience", "curiosity", "truthfulness"]
+    run_id = int(time.time())
+
+    with db.get_cursor() as (cursor, connection):
+        cursor.executemany("""
+            INSERT INTO scenario (info) VALUES (%s)
+        """, [(json.dumps({"depth": 1, "scene_narrative": [], "choices": []}),) for _ in range(scenarios)])
+        cursor.execute("SELECT scenario_id FROM scenario")
+        scenario_ids = [row[0] for row in cursor.fetchall()]
+        cursor.executemany("""
+            INSERT IGNORE INTO scenario_node (scenario_id, path, depth, node) VALUES (%s, '', 1, %s)
+        """, [(scenario_id, json.dumps({"depth": 1, "scene_narrative": [], "choices": []})) for scenario_id in scenario_ids])
+
+        cursor.executemany("""
+            INSERT INTO achievements (name, description) VALUES (%s, %s)
+        """, [(f"Achievement {i}", "Seeded achievement") for i in range(20)])
+        cursor.execute("SELECT achievement_id FROM achievements")
+        achievement_ids = [row[0] for row in cursor.fetchall()]
+
+        cursor.executemany("""
+            INSERT INTO user_info (username, email, hashpassword, trait_profile, game_played, game_history, is_active)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, [(
+            f"seed_{run_id}_{i}",
+            f"seed_{run_id}_{i}@example.com",
+            "x",
+            json.dumps({trait: rng.randint(0, 100) for trait in traits}),
+            rng.randint(0, 50),
+            json.dumps({}),
+            rng.random() > 0.1
+        ) for i in range(users)])
+        cursor.execute("SELECT userid FROM user_info WHERE username LIKE %s", (f"seed_{run_id}_%",))
+        user_ids = [row[0] for row in cursor.fetchall()]
+
+        for user_id in user_ids:
+            for _ in range(sessions_per_user):
+                mode = rng.choice(["learn", "grow"])
+                cursor.execute("""
+                    INSERT INTO game_session (user_id, mode, scenario_id, ended_at, is_completed)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (user_id, mode, rng.choice(scenario_ids) if mode == "learn" else None, datetime.utcnow(), rng.random() > 0.3))
+                session_id = cursor.lastrowid
+                cursor.executemany("""
+                    INSERT INTO user_choices (session_id, depth, choice_id, trait_impact)
+                    VALUES (%s, %s, %s, %s)
+                """, [(session_id, depth, rng.choice("ABC"), rng.choice(["high", "moderate", "low"]))
+                      for depth in range(1, choices_per_session + 1)])
+                if mode == "grow":
+                    cursor.executemany("""
+                        INSERT INTO generated_scenarios (session_id, depth, scenario_json)
+                        VALUES (%s, %s, %s)
+                    """, [(session_id, depth, json.dumps({"depth": depth})) for depth in range(1, choices_per_session + 1)])
+            cursor.executemany("""
+                INSERT IGNORE INTO user_achievements (user_id, achievement_id) VALUES (%s, %s)
+            """, [(user_id, achievement_id) for achievement_id in rng.sample(achievement_ids, 2)])
+
+        connection.commit()
+
+        for table in ["user_info", "game_session", "user_choices", "scenario", "scenario_node", "generated_scenarios",
+                      "session_analytics", "session_history", "achievements", "user_achievements"]:
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+
+    print(f"Seeded {len(user_ids)} users, {len(user_ids) * sessions_per_user} sessions")
+
+def pick_sample_ids():
+    db = Database()
+    with db.get_cursor(dictionary=True) as (cursor, connection):
+        cursor.execute("""
+            SELECT gs.user_id, u.username, gs.session_id, gs.scenario_id
+            FROM game_session gs
+            JOIN user_info u ON u.userid = gs.user_id
+            WHERE gs.mode = 'learn'
+            ORDER BY gs.session_id DESC
+            LIMIT 1
+        """)
+        learn = cursor.fetchone()
+        cursor.execute("""
+            SELECT session_id FROM game_session
+            WHERE mode = 'grow' AND user_id = %s
+            LIMIT 1
+        """, (learn["user_id"],))
+        grow = cursor.fetchone()
+        cursor.execute("SELECT achievement_id FROM achievements ORDER BY achievement_id DESC LIMIT 1")
+        achievement = cursor.fetchone()
+        # A write-behind flush updates many users in one statement
+        cursor.execute("SELECT userid FROM user_info ORDER BY userid DESC LIMIT 50")
+        batch_user_ids = [row["userid"] for row in cursor.fetchall()]
+    return SimpleNamespace(
+        batch_user_ids=batch_user_ids,
+        user_id=learn["user_id"],
+        username=learn["username"],
+        session_id=learn["session_id"],
+        scenario_id=learn["scenario_id"],
+        grow_session_id=grow["session_id"] if grow else learn["session_id"],
+        achievement_id=achievement["achievement_id"]
+    )
+
+def build_checks(ids):
+    suffix = int(time.time() * 1000)
+    new_user = SimpleNamespace(
+        username=f"explain_{suffix}",
+        email=f"explain_{suffix}@example.com",
+        password="explain-check",
+        trait_profile={"bravery": 50}
+    )
+    user_update = SimpleNamespace(email=None, trait_profile=None)
+    # A fresh token, so the lookup is not answered by the principal cache
+    token = auth.create_access_token({"sub": ids.username, "check": suffix})
+
+    return [
+        ("auth.get_principal_async", lambda: auth.get_principal_async(token)),
+        ("auth.get_current_user_async", lambda: auth.get_current_user_async(token)),
+        # Unknown username, so the lookup runs but no password is verified
+        ("auth.authenticate_user_async", lambda: auth.authenticate_user_async(f"explain_missing_{suffix}", "explain-check")),
+        ("UserCRUD.create_user", lambda: crud.UserCRUD.create_user(new_user)),
+        ("UserCRUD.get_user", lambda: crud.UserCRUD.get_user(ids.user_id)),
+        ("UserCRUD.update_user", lambda: crud.UserCRUD.update_user(ids.user_id, user_update)),
+        ("UserCRUD.update_user_traits", lambda: crud.UserCRUD.update_user_traits(ids.user_id, {"bravery": 1})),
+        ("UserCRUD.apply_trait_deltas_batch",
+         lambda: crud.UserCRUD.apply_trait_deltas_batch({user_id: {"*": 1} for user_id in ids.batch_user_ids})),
+        ("UserCRUD.increment_games_played_batch",
+         lambda: crud.UserCRUD.increment_games_played_batch({user_id: 1 for user_id in ids.batch_user_ids})),
+        ("UserCRUD.get_all_users", lambda: crud.UserCRUD.get_all_users()),
+        ("UserCRUD.increment_games_played", lambda: crud.UserCRUD.increment_games_played(ids.user_id)),
+        ("SessionCRUD.get_session", lambda: crud.SessionCRUD.get_session(ids.session_id)),
+        ("SessionCRUD.update_session", lambda: crud.SessionCRUD.update_session(ids.session_id, datetime.utcnow(), True)),
+        ("SessionCRUD.get_user_sessions", lambda: crud.SessionCRUD.get_user_sessions(ids.user_id)),
+        ("SessionCRUD.get_user_sessions(mode)", lambda: crud.SessionCRUD.get_user_sessions(ids.user_id, "learn")),
+        ("SessionCRUD.get_session_with_details", lambda: crud.SessionCRUD.get_session_with_details(ids.session_id)),
+        ("ChoiceCRUD.get_session_choices", lambda: crud.ChoiceCRUD.get_session_choices(ids.session_id)),
+        ("ChoiceCRUD.get_choice_details", lambda: crud.ChoiceCRUD.get_choice_details(ids.session_id, 1)),
+        ("ChoiceCRUD.get_choice_impacts", lambda: crud.ChoiceCRUD.get_choice_impacts(ids.session_id)),
+        ("ScenarioCRUD.get_scenario", lambda: crud.ScenarioCRUD.get_scenario(ids.scenario_id)),
+        ("ScenarioCRUD.get_scenario_version", lambda: crud.ScenarioCRUD.get_scenario_version(ids.scenario_id)),
+        ("ScenarioCRUD.get_compiled_scenario", lambda: crud.ScenarioCRUD.get_compiled_scenario(ids.scenario_id)),
+        ("ScenarioCRUD.get_scenario_node", lambda: crud.ScenarioCRUD.get_scenario_node(ids.scenario_id, "")),
+        ("ScenarioCRUD.get_scenario_nodes", lambda: crud.ScenarioCRUD.get_scenario_nodes(ids.scenario_id, ["", "A"])),
+        ("ScenarioCRUD.update_scenario", lambda: crud.ScenarioCRUD.update_scenario(ids.scenario_id, {"depth": 1, "choices": []})),
+        ("ScenarioCRUD.update_scenario_node", lambda: crud.ScenarioCRUD.update_scenario_node(ids.scenario_id, "", {"depth": 1, "choices": []})),
+        ("ScenarioCRUD.assemble_from_nodes", lambda: crud.ScenarioCRUD.assemble_from_nodes(ids.scenario_id)),
+        ("ScenarioCRUD.list_scenarios", lambda: crud.ScenarioCRUD.list_scenarios()),
+        ("ScenarioCRUD.get_scenario_metadata", lambda: crud.ScenarioCRUD.get_scenario_metadata(ids.scenario_id)),
+        ("GeneratedScenarioCRUD.get_generated_scenario", lambda: crud.GeneratedScenarioCRUD.get_generated_scenario(ids.grow_session_id, 1)),
+        ("GeneratedScenarioCRUD.get_all_generated_scenarios", lambda: crud.GeneratedScenarioCRUD.get_all_generated_scenarios(ids.grow_session_id)),
+        ("SessionHistoryCRUD.save_session_history", lambda: crud.SessionHistoryCRUD.save_session_history(ids.user_id, ids.session_id, {"results": {}})),
+        ("SessionHistoryCRUD.get_session_history", lambda: crud.SessionHistoryCRUD.get_session_history(ids.user_id, ids.session_id)),
+        ("SessionHistoryCRUD.get_user_history", lambda: crud.SessionHistoryCRUD.get_user_history(ids.user_id)),
+        ("AnalyticsCRUD.get_user_stats", lambda: crud.AnalyticsCRUD.get_user_stats(ids.user_id)),
+        ("AnalyticsCRUD.get_leaderboard", lambda: crud.AnalyticsCRUD.get_leaderboard()),
+        ("AnalyticsCRUD.get_choice_analytics", lambda: crud.AnalyticsCRUD.get_choice_analytics()),
+        ("AnalyticsCRUD.get_choice_analytics(scenario_id)", lambda: crud.AnalyticsCRUD.get_choice_analytics(ids.scenario_id)),
+        ("AnalyticsCRUD.get_user_progress_over_time", lambda: crud.AnalyticsCRUD.get_user_progress_over_time(ids.user_id)),
+        ("AchievementCRUD.list_achievements", lambda: crud.AchievementCRUD.list_achievements()),
+        ("AchievementCRUD.get_user_achievements", lambda: crud.AchievementCRUD.get_user_achievements(ids.user_id)),
+        ("AchievementCRUD.unlock_achievement", lambda: crud.AchievementCRUD.unlock_achievement(ids.user_id, ids.achievement_id)),
+        ("AchievementCRUD.check_achievement_eligibility", lambda: crud.AchievementCRUD.check_achievement_eligibility(ids.user_id)),
+    ]
+
+def find_full_scans(plan_rows):
+    """
+    Tables read with access type ALL. Derived/temporary tables and
+    JSON_TABLE table functions (always type ALL, they are the statement's
+    own parameter) are ignored.
+    """
+    return [row["table"] for row in plan_rows
+            if row.get("type") == "ALL" and row.get("table") and not row["table"].startswith("<")
+            and "Table function" not in (row.get("Extra") or "")]
+
+async def run_checks():
+    ids = pick_sample_ids()
+    explaining_db = ExplainingDatabase()
+    # The same modules the routes query through
+    crud.adb = explaining_db
+    auth.adb = explaining_db
+
+    failures = []
+    try:
+        for label, call in build_checks(ids):
+            explaining_db.current_check = label
+            await call()
+    finally:
+        explaining_db.dispose()
+
+    for label, query, plan_rows in explaining_db.plans:
+        scanned = find_full_scans(plan_rows)
+        if not scanned:
+            print(f"ok         {label}")
+        elif label in EXPECTED_FULL_SCANS:
+            print(f"expected   {label}: full scan of {', '.join(scanned)} ({EXPECTED_FULL_SCANS[label]})")
+        else:
+            print(f"FULL SCAN  {label}: {', '.join(scanned)}\n           {query}")
+            failures.append(label)
+
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if any CRUD query does a full table scan")
+    parser.add_argument("--seed", action="store_true", help="seed a dataset before checking (scratch databases only)")
+    args = parser.parse_args()
+
+    if args.seed:
+        seed()
+
+    failures = asyncio.run(run_checks())
+    if failures:
+        print(f"\n{len(failures)} queries do full table scans")
+        sys.exit(1)
+    print("\nNo unexpected full table scans")
@@ -1,10 +1,330 @@
 import mysql.connector
+import aiomysql
+import asyncio
+import contextvars
 import os
+import threading
+import time
+from collections import deque
 from dotenv import load_dotenv
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
+from instrumentation import InstrumentedCursor, AsyncInstrumentedCursor
 
 load_dotenv()
 
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_RESET_ON_RETURN = os.getenv("DB_POOL_RESET_ON_RETURN", "true").lower() == "true"
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out within the pool timeout"""
+    pass
+
+class BasePool:
+    """Settings, bookkeeping and metrics shared by the sync and async pools"""
+    def __init__(self, connect, size: int = DB_POOL_SIZE, max_overflow: int = DB_POOL_MAX_OVERFLOW,
+                 timeout: float = DB_POOL_TIMEOUT, recycle: int = DB_POOL_RECYCLE,
+                 pre_ping: bool = DB_POOL_PRE_PING, reset_on_return: bool = DB_POOL_RESET_ON_RETURN):
+        self._connect = connect
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.reset_on_return = reset_on_return
+
+        self._idle = deque()
+        self._created_at = {}
+        self._total = 0
+        self._checked_out = 0
+
+        # Metrics
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._recycled = 0
+        self._invalidated = 0
+
+    def _is_expired(self, connection):
+        if self.recycle <= 0:
+            return False
+        created_at = self._created_at.get(id(connection), 0)
+        return time.monotonic() - created_at > self.recycle
+
+    def _timeout_error(self):
+        self._timeouts += 1
+        return PoolTimeoutError(
+            f"Could not get a database connection within {self.timeout}s "
+            f"(size={self.size}, overflow={self.max_overflow})"
+        )
+
+    def _record_checkout(self, start: float, waited: bool):
+        self._checked_out += 1
+        self._checkouts += 1
+        wait_time = time.monotonic() - start
+        if waited:
+            self._waits += 1
+        self._wait_time_total += wait_time
+        self._wait_time_max = max(self._wait_time_max, wait_time)
+
+    def _snapshot(self):
+        return {
+            "size": self.size,
+            "max_overflow": self.max_overflow,
+            "total": self._total,
+            "checked_out": self._checked_out,
+            "idle": len(self._idle),
+            "overflow": max(0, self._total - self.size),
+            "checkouts": self._checkouts,
+            "waits": self._waits,
+            "wait_time_total_ms": round(self._wait_time_total * 1000, 3),
+            "wait_time_avg_ms": round(self._wait_time_total * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+            "wait_time_max_ms": round(self._wait_time_max * 1000, 3),
+            "checkout_timeouts": self._timeouts,
+            "recycled": self._recycled,
+            "invalidated": self._invalidated
+        }
+
+class ConnectionPool(BasePool):
+    """
+    Thread-safe pool of MySQL connections.
+
+    Keeps up to `size` idle connections around and allows `max_overflow`
+    extra connections under load, which are closed again when returned.
+    """
+    def __init__(self, connect, **kwargs):
+        super().__init__(connect, **kwargs)
+        self._cond = threading.Condition()
+
+    def _new_connection(self):
+        connection = self._connect()
+        self._created_at[id(connection)] = time.monotonic()
+        return connection
+
+    def _discard(self, connection):
+        self._created_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _prepare(self, connection):
+        """Make sure a connection taken from the idle list is still usable"""
+        if connection is None:
+            return self._new_connection()
+
+        if self._is_expired(connection):
+            self._recycled += 1
+            self._discard(connection)
+            return self._new_connection()
+
+        if self.pre_ping:
+            try:
+                alive = connection.is_connected()
+            except Exception:
+                alive = False
+            if not alive:
+                self._invalidated += 1
+                self._discard(connection)
+                return self._new_connection()
+
+        return connection
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    connection = self._idle.pop()
+                    break
+                if self._total < self.size + self.max_overflow:
+                    # Reserve a slot, the connection itself is opened outside the lock
+                    self._total += 1
+                    connection = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._timeout_error()
+                waited = True
+                self._cond.wait(remaining)
+
+            self._record_checkout(start, waited)
+
+        try:
+            return self._prepare(connection)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._checked_out -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, connection):
+        keep = True
+
+        if self.reset_on_return:
+            # Roll back anything left open so the next user starts from a
+            # clean transaction instead of a stale REPEATABLE READ snapshot
+            try:
+                connection.rollback()
+            except Exception:
+                keep = False
+
+        with self._cond:
+            self._checked_out -= 1
+            if keep and len(self._idle) < self.size and not self._is_expired(connection):
+                self._idle.append(connection)
+                connection = None
+            else:
+                self._total -= 1
+            self._cond.notify()
+
+        if connection is not None:
+            self._discard(connection)
+
+    def dispose(self):
+        """Close all idle connections"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._total -= len(idle)
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self):
+        with self._cond:
+            return self._snapshot()
+
+class AsyncConnectionPool(BasePool):
+    """
+    asyncio counterpart of ConnectionPool built on aiomysql connections.
+
+    Must only be used from a single event loop.
+    """
+    def __init__(self, connect, **kwargs):
+        super().__init__(connect, **kwargs)
+        # Created lazily so the condition binds to the running loop
+        self._cond = None
+
+    def _condition(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def _new_connection(self):
+        connection = await self._connect()
+        self._created_at[id(connection)] = time.monotonic()
+        return connection
+
+    def _discard(self, connection):
+        self._created_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    async def _prepare(self, connection):
+        """Make sure a connection taken from the idle list is still usable"""
+        if connection is None:
+            return await self._new_connection()
+
+        if self._is_expired(connection):
+            self._recycled += 1
+            self._discard(connection)
+            return await self._new_connection()
+
+        if self.pre_ping:
+            try:
+                await connection.ping(reconnect=False)
+                alive = True
+            except Exception:
+                alive = False
+            if not alive:
+                self._invalidated += 1
+                self._discard(connection)
+                return await self._new_connection()
+
+        return connection
+
+    async def acquire(self):
+        cond = self._condition()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+
+        async with cond:
+            while True:
+                if self._idle:
+                    connection = self._idle.pop()
+                    break
+                if self._total < self.size + self.max_overflow:
+                    self._total += 1
+                    connection = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._timeout_error()
+                waited = True
+                try:
+                    await asyncio.wait_for(cond.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            self._record_checkout(start, waited)
+
+        try:
+            return await self._prepare(connection)
+        except BaseException:
+            async with cond:
+                self._total -= 1
+                self._checked_out -= 1
+                cond.notify()
+            raise
+
+    async def release(self, connection):
+        keep = not connection.closed
+
+        if keep and self.reset_on_return:
+            try:
+                await connection.rollback()
+            except Exception:
+                keep = False
+
+        cond = self._condition()
+        async with cond:
+            self._checked_out -= 1
+            if keep and len(self._idle) < self.size and not self._is_expired(connection):
+                self._idle.append(connection)
+                connection = None
+            else:
+                self._total -= 1
+            cond.notify()
+
+        if connection is not None:
+            self._discard(connection)
+
+    def dispose(self):
+        """Close all idle connections"""
+        idle = list(self._idle)
+        self._idle.clear()
+        self._total -= len(idle)
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self):
+        return self._snapshot()
+
 class Database:
     def __init__(self):
         self.connection_config = {
@@ -13,19 +333,20 @@ class Database:
             'password': os.getenv("DB_PASSWORD"),
             'database': os.getenv("DB_NAME")
         }
-    
+        self.pool = ConnectionPool(lambda: mysql.connector.connect(**self.connection_config))
+
     @contextmanager
     def get_connection(self):
-        connection = mysql.connector.connect(**self.connection_config)
+        connection = self.pool.acquire()
         try:
             yield connection
         finally:
-            connection.close()
-    
+            self.pool.release(connection)
+
     @contextmanager
     def get_cursor(self, dictionary=False):
         with self.get_connection() as connection:
-            cursor = connection.cursor(dictionary=dictionary)
+            cursor = InstrumentedCursor(connection.cursor(dictionary=dictionary))
             try:
                 yield cursor, connection
             finally:
@@ -37,4 +358,172 @@ class Database:
                     pass
                 cursor.close()
 
-db = Database()
\ No newline at end of file
+    def pool_stats(self):
+        return self.pool.stats()
+
+    def dispose(self):
+        self.pool.dispose()
+
+# Unit of work bound to the current request, see AsyncDatabase.unit_of_work
+_current_unit_of_work = contextvars.ContextVar("current_unit_of_work", default=None)
+
+class UnitOfWork:
+    """
+    One connection and one transaction shared by everything a request does.
+
+    The connection is only checked out on first use. CRUD methods keep calling
+    connection.commit() as usual; inside a unit of work those commits are
+    deferred until the unit of work itself is closed.
+    """
+    def __init__(self, database):
+        self._db = database
+        # Only the task that opened the unit of work may use it, background
+        # tasks spawned from a request get their own connections
+        self._owner = asyncio.current_task()
+        self.connection = None
+        self.closed = False
+        self._after_commit = []
+
+    def is_active(self):
+        return not self.closed and asyncio.current_task() is self._owner
+
+    async def get_connection(self):
+        if self.connection is None:
+            self.connection = await self._db.pool.acquire()
+        return self.connection
+
+    async def commit(self):
+        if self.connection is not None:
+            await self.connection.commit()
+
+    async def rollback(self):
+        if self.connection is not None:
+            await self.connection.rollback()
+
+    async def _release(self):
+        connection, self.connection = self.connection, None
+        await self._db.pool.release(connection)
+
+    async def commit_now(self):
+        """
+        Commit what was done so far and hand the connection back to the pool.
+
+        Handlers call this before awaiting slow external I/O (LLM calls), so
+        the connection and its row locks are not held meanwhile. The unit of
+        work stays usable, the next query checks out a connection again.
+        """
+        if self.connection is not None:
+            try:
+                await self.connection.commit()
+            finally:
+                await self._release()
+
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in after-commit callback: {e}")
+
+    async def release(self):
+        """Roll back and hand the connection back to the pool, for units of work that wrote nothing"""
+        if self.connection is not None:
+            try:
+                await self.connection.rollback()
+            finally:
+                await self._release()
+
+    async def close(self, commit: bool = True):
+        if self.closed:
+            return
+        self.closed = True
+        if commit:
+            await self.commit_now()
+        else:
+            await self.release()
+
+class DeferredCommitConnection:
+    """Connection handed out inside a unit of work, commit() is left to the unit of work"""
+    def __init__(self, connection):
+        self._connection = connection
+
+    async def commit(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+def current_unit_of_work():
+    return _current_unit_of_work.get()
+
+async def commit_now():
+    """Commit and release the connection of the current unit of work, if any (see UnitOfWork.commit_now)"""
+    uow = _current_unit_of_work.get()
+    if uow is not None and uow.is_active():
+        await uow.commit_now()
+
+def after_commit(callback):
+    """Run callback once the current unit of work has committed (right away outside of one)"""
+    uow = _current_unit_of_work.get()
+    if uow is not None and uow.is_active():
+        uow._after_commit.append(callback)
+    else:
+        callback()
+
+class AsyncDatabase:
+    def __init__(self):
+        self.connection_config = {
+            'host': os.getenv("DB_HOST"),
+            'user': os.getenv("DB_USER"),
+            'password': os.getenv("DB_PASSWORD"),
+            'db': os.getenv("DB_NAME"),
+            'autocommit': False
+        }
+        self.pool = AsyncConnectionPool(lambda: aiomysql.connect(**self.connection_config))
+
+    @asynccontextmanager
+    async def get_connection(self):
+        uow = _current_unit_of_work.get()
+        if uow is not None and uow.is_active():
+            yield DeferredCommitConnection(await uow.get_connection())
+        else:
+            connection = await self.pool.acquire()
+            try:
+                yield connection
+            finally:
+                await self.pool.release(connection)
+
+    @asynccontextmanager
+    async def unit_of_work(self):
+        """Share one connection and transaction across everything run inside the block"""
+        uow = UnitOfWork(self)
+        token = _current_unit_of_work.set(uow)
+        try:
+            yield uow
+        except BaseException:
+            await uow.close(commit=False)
+            raise
+        else:
+            await uow.close(commit=True)
+        finally:
+            _current_unit_of_work.reset(token)
+
+    @asynccontextmanager
+    async def get_cursor(self, dictionary=False):
+        async with self.get_connection() as connection:
+            cursor = AsyncInstrumentedCursor(
+                await connection.cursor(aiomysql.DictCursor if dictionary else aiomysql.Cursor)
+            )
+            try:
+                yield cursor, connection
+            finally:
+                await cursor.close()
+
+    def pool_stats(self):
+        return self.pool.stats()
+
+    def dispose(self):
+        self.pool.dispose()
+
+db = Database()
+adb = AsyncDatabase()
@@ -1,11 +1,29 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from auth import get_current_user
+from auth import get_current_user_async, get_principal_async
+from database import current_unit_of_work
+import write_behind
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+async def get_current_principal(token: str = Depends(oauth2_scheme)):
+    """Authorize the request with a single narrow lookup (userid, username, is_active)"""
+    principal = await get_principal_async(token)
+    if not principal.get('is_active', True):
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return principal
+
 async def get_current_active_user(token: str = Depends(oauth2_scheme)):
-    user = get_current_user(token)
+    """Principal plus profile fields (email, trait_profile, game_played, created_at) for routes that need them"""
+    user = await get_current_user_async(token)
     if not user.get('is_active', True):
         raise HTTPException(status_code=400, detail="Inactive user")
-    return user
\ No newline at end of file
+    # Include trait/counter changes that are still buffered
+    return write_behind.overlay(user)
+
+async def get_unit_of_work():
+    """The connection/transaction shared by the current request (see UnitOfWorkMiddleware)"""
+    uow = current_unit_of_work()
+    if uow is None:
+        raise HTTPException(status_code=500, detail="No unit of work bound to this request")
+    return uow
@@ -0,0 +1,193 @@
+"""
+Offline LLM provider for load and capacity tests (LLM_PROVIDER=fake).
+
+Answers every chat completion with schema-valid JSON without any network
+call: a game summary when the prompt asks for one, a grow scenario
+otherwise. The answer is derived from a hash of the request, so the same
+prompt always gets the same text.
+
+Latency and failures are drawn from a generator seeded with FAKE_LLM_SEED,
+so a test run is repeatable:
+- FAKE_LLM_LATENCY_DIST: fixed, uniform, exponential or lognormal
+- FAKE_LLM_LATENCY_MS: the median (mean for exponential) in milliseconds
+- FAKE_LLM_LATENCY_SPREAD: sigma for lognormal, +/- fraction for uniform
+- FAKE_LLM_ERROR_RATE: fraction of calls that raise FakeLLMError
+- FAKE_LLM_HANG_RATE: fraction of calls that never answer, to exercise deadlines
+Streamed answers are cut into FAKE_LLM_STREAM_CHUNK character deltas spread
+over the drawn latency.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+from llm import LLMProvider
+
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+FAKE_LLM_LATENCY_DIST = os.getenv("FAKE_LLM_LATENCY_DIST", "lognormal")
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "1500"))
+FAKE_LLM_LATENCY_SPREAD = float(os.getenv("FAKE_LLM_LATENCY_SPREAD", "0.5"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_HANG_RATE = float(os.getenv("FAKE_LLM_HANG_RATE", "0"))
+FAKE_LLM_STREAM_CHUNK = int(os.getenv("FAKE_LLM_STREAM_CHUNK", "24"))
+
+PLACES = ["an abandoned hospital wing", "a flooded subway tunnel", "a lighthouse in a storm",
+          "a locked library at midnight", "a train stalled between stations", "a house with no mirrors"]
+EVENTS = ["the lights die without warning", "a stranger calls you by name", "a door that was locked swings open",
+          "someone is crying behind the wall", "your phone shows a message you never sent"]
+SFX = ["tension", "heartbeat", "whisper", "footsteps", "static", "thunder"]
+GENRES = [
+    ("Psychological Thriller", "A tense story where the real danger is inside the player's own mind."),
+    ("Mystery", "A puzzle of clues and hidden motives that the player pieces together choice by choice."),
+    ("Survival Horror", "A fight to stay safe against threats the player can barely see.")
+]
+DEGREES = ["high", "moderate", "low"]
+
+class FakeLLMError(Exception):
+    """Injected provider failure"""
+    pass
+
+def _prompt_text(kwargs: dict) -> str:
+    return "\n".join(str(message.get("content", "")) for message in kwargs.get("messages", []))
+
+def fake_scenario(rng: random.Random, depth: int, trait_focus: str) -> dict:
+    place = rng.choice(PLACES)
+    return {
+        "depth": depth,
+        "scene_narrative": [
+            {"text": f"You wake up in {place}.", "sfx": rng.choice(SFX)},
+            {"text": f"Then {rng.choice(EVENTS)}.", "sfx": rng.choice(SFX)},
+            {"text": f"Whatever you do next will test your {trait_focus}.", "sfx": rng.choice(SFX)}
+        ],
+        "narrative_purpose": f"Test {trait_focus} under pressure",
+        "personalization_notes": "Generated by the fake LLM provider",
+        "choices": [
+            {
+                "choice_id": choice_id,
+                "choice_text": text,
+                "maps_to_trait_details": {"trait": trait_focus, "degree": degree},
+                "short_hidden_message": f"A {degree} {trait_focus} move"
+            }
+            for choice_id, text, degree in zip(
+                "ABC",
+                ["Face it head on", "Look for another way", "Stay where you are"],
+                DEGREES
+            )
+        ],
+        "is_end": False
+    }
+
+def fake_summary(rng: random.Random) -> dict:
+    genre, genre_description = rng.choice(GENRES)
+    return {
+        "story_summary": f"In {rng.choice(PLACES)}, the player pressed on after {rng.choice(EVENTS)}, "
+                         "weighing every risk before committing to the path that finally led them out.",
+        "trait_summary": "The player balanced caution with resolve, taking bold steps only when the stakes were clear.",
+        "genre": genre,
+        "genre_description": genre_description
+    }
+
+class FakeLLMProvider(LLMProvider):
+    name = "fake"
+
+    def __init__(self, seed: int = FAKE_LLM_SEED, latency_dist: str = FAKE_LLM_LATENCY_DIST,
+                 latency_ms: float = FAKE_LLM_LATENCY_MS, latency_spread: float = FAKE_LLM_LATENCY_SPREAD,
+                 error_rate: float = FAKE_LLM_ERROR_RATE, hang_rate: float = FAKE_LLM_HANG_RATE,
+                 stream_chunk: int = FAKE_LLM_STREAM_CHUNK):
+        if latency_dist not in ("fixed", "uniform", "exponential", "lognormal"):
+            raise ValueError(f"Unknown FAKE_LLM_LATENCY_DIST {latency_dist!r}")
+        self.latency_dist = latency_dist
+        self.latency_ms = latency_ms
+        self.latency_spread = latency_spread
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.stream_chunk = stream_chunk
+        self._rng = random.Random(seed)
+
+        # Metrics
+        self._calls = 0
+        self._errors = 0
+        self._hangs = 0
+        self._latency_total = 0.0
+
+    def _latency(self) -> float:
+        """Seconds the next call takes"""
+        if self.latency_dist == "fixed":
+            ms = self.latency_ms
+        elif self.latency_dist == "uniform":
+            ms = self._rng.uniform(self.latency_ms * (1 - self.latency_spread), self.latency_ms * (1 + self.latency_spread))
+        elif self.latency_dist == "exponential":
+            ms = self._rng.expovariate(1 / self.latency_ms) if self.latency_ms > 0 else 0.0
+        else:
+            ms = self._rng.lognormvariate(0, self.latency_spread) * self.latency_ms
+        return max(ms, 0.0) / 1000
+
+    def _plan(self):
+        """(latency, outcome) of the next call, outcome is "ok", "error" or "hang" """
+        self._calls += 1
+        latency = self._latency()
+        roll = self._rng.random()
+        if roll < self.hang_rate:
+            self._hangs += 1
+            return latency, "hang"
+        if roll < self.hang_rate + self.error_rate:
+            self._errors += 1
+            return latency, "error"
+        self._latency_total += latency
+        return latency, "ok"
+
+    async def _fail(self, latency: float, outcome: str):
+        if outcome == "hang":
+            # Until the caller's deadline cancels it
+            await asyncio.Event().wait()
+        await asyncio.sleep(latency)
+        raise FakeLLMError("Injected fake LLM failure")
+
+    def answer(self, **kwargs) -> str:
+        """The JSON text the fake answers this request with"""
+        prompt = _prompt_text(kwargs)
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        if "story_summary" in prompt:
+            return json.dumps(fake_summary(rng))
+        depth = re.search(r"[Dd]epth\D{0,3}(\d+)", prompt)
+        trait_focus = re.search(r"[Tt]rait[ _][Ff]ocus\W{0,3}([a-z]+)", prompt)
+        return json.dumps(fake_scenario(
+            rng,
+            int(depth.group(1)) if depth else 1,
+            trait_focus.group(1) if trait_focus else "bravery"
+        ))
+
+    async def complete(self, **kwargs) -> str:
+        latency, outcome = self._plan()
+        if outcome != "ok":
+            await self._fail(latency, outcome)
+        await asyncio.sleep(latency)
+        return self.answer(**kwargs)
+
+    async def stream(self, **kwargs):
+        latency, outcome = self._plan()
+        text = self.answer(**kwargs)
+        chunks = [text[i:i + self.stream_chunk] for i in range(0, len(text), self.stream_chunk)]
+        if outcome != "ok":
+            # Fails part way through, after some deltas were sent
+            for chunk in chunks[:len(chunks) // 2]:
+                yield chunk
+            await self._fail(latency / 2, outcome)
+        for chunk in chunks:
+            await asyncio.sleep(latency / len(chunks))
+            yield chunk
+
+    def stats(self):
+        succeeded = self._calls - self._errors - self._hangs
+        return {
+            "latency_dist": self.latency_dist,
+            "latency_ms": self.latency_ms,
+            "latency_spread": self.latency_spread,
+            "error_rate": self.error_rate,
+            "hang_rate": self.hang_rate,
+            "calls": self._calls,
+            "errors": self._errors,
+            "hangs": self._hangs,
+            "latency_avg_ms": round(self._latency_total * 1000 / succeeded, 3) if succeeded else 0.0
+        }
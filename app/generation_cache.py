@@ -0,0 +1,134 @@
+"""
+Cache of generated grow scenarios keyed by their prompt inputs.
+
+Many generations ask for the same thing: same depth, trait focus and
+previous choices from players with similar trait profiles. The inputs are
+normalized into a fingerprint (trait values and games played are bucketed
+into bands of GENERATION_CACHE_TRAIT_BAND / GENERATION_CACHE_GAMES_BAND)
+together with the prompt config version, and a scenario generated for one
+player is served to every later request with the same fingerprint.
+
+Entries live in an in-process LRU with a TTL and, if GENERATION_CACHE_DIR is
+set, in JSON files there too, so they survive restarts and are shared by
+the workers on a host.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import time
+from cache import LRUCache
+
+GENERATION_CACHE_ENABLED = os.getenv("GENERATION_CACHE_ENABLED", "1") == "1"
+GENERATION_CACHE_SIZE = int(os.getenv("GENERATION_CACHE_SIZE", "2048"))
+GENERATION_CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", "3600"))
+# Trait values (0-100) in the same band share cache entries; 1 = exact values
+GENERATION_CACHE_TRAIT_BAND = int(os.getenv("GENERATION_CACHE_TRAIT_BAND", "20"))
+GENERATION_CACHE_GAMES_BAND = int(os.getenv("GENERATION_CACHE_GAMES_BAND", "5"))
+# Directory of the on-disk tier, disabled when empty
+GENERATION_CACHE_DIR = os.getenv("GENERATION_CACHE_DIR", "")
+
+def fingerprint(depth: int, trait_focus: str, previous_choices: list, user_data: dict, prompt_version: str,
+                trait_band: int = GENERATION_CACHE_TRAIT_BAND, games_band: int = GENERATION_CACHE_GAMES_BAND) -> str:
+    """Stable key of the normalized generation inputs"""
+    trait_profile = user_data.get("trait_profile") or {}
+    inputs = {
+        "depth": depth,
+        "trait_focus": trait_focus,
+        "previous_choices": list(previous_choices or []),
+        "traits": {trait: int(value) // trait_band for trait, value in trait_profile.items()},
+        "games": int(user_data.get("game_played", 0)) // games_band,
+        "prompt_version": prompt_version
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+class GenerationCache:
+    def __init__(self, enabled: bool = GENERATION_CACHE_ENABLED, maxsize: int = GENERATION_CACHE_SIZE,
+                 ttl: float = GENERATION_CACHE_TTL, directory: str = GENERATION_CACHE_DIR):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.directory = directory
+        self._memory = LRUCache("generation", maxsize=maxsize, ttl=ttl)
+
+        # Metrics
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._saved_ms = 0.0
+
+    def _path(self, key: str):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _read_file(self, key: str):
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["created_at"] > self.ttl:
+            return None
+        return entry
+
+    def _write_file(self, key: str, entry: dict):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    async def get(self, key: str):
+        """Copy of the cached scenario, None on a miss"""
+        if not self.enabled:
+            return None
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory_hits += 1
+        elif self.directory:
+            entry = await asyncio.to_thread(self._read_file, key)
+            if entry is not None:
+                self._disk_hits += 1
+                self._memory.set(key, entry)
+
+        if entry is None:
+            self._misses += 1
+            return None
+        self._saved_ms += entry["generation_ms"]
+        # Callers may modify the scenario they get
+        return copy.deepcopy(entry["scenario"])
+
+    async def set(self, key: str, scenario: dict, generation_ms: float):
+        if not self.enabled:
+            return
+
+        entry = {"scenario": copy.deepcopy(scenario), "generation_ms": generation_ms, "created_at": time.time()}
+        self._memory.set(key, entry)
+        self._stores += 1
+        if self.directory:
+            try:
+                await asyncio.to_thread(self._write_file, key, entry)
+            except OSError as e:
+                print(f"Could not write generation cache file: {e}")
+
+    def stats(self):
+        hits = self._memory_hits + self._disk_hits
+        lookups = hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "ttl": self.ttl,
+            "disk_tier": self.directory or None,
+            "trait_band": GENERATION_CACHE_TRAIT_BAND,
+            "games_band": GENERATION_CACHE_GAMES_BAND,
+            "memory_hits": self._memory_hits,
+            "disk_hits": self._disk_hits,
+            "misses": self._misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "stores": self._stores,
+            "saved_llm_ms": round(self._saved_ms, 3)
+        }
+
+generation_cache = GenerationCache()
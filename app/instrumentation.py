@@ -0,0 +1,224 @@
+"""
+Query instrumentation for the cursors handed out by database.py.
+
+Every execute() is timed and recorded with its normalized SQL, the number of
+rows it returned (or affected) and the function that issued it. Records are
+collected per request (see QueryStatsMiddleware) and statements slower than
+SLOW_QUERY_MS are written to the "db.slow" logger. Callers are resolved
+with a short, bounded frame walk whose per-code-object result is cached, so
+recording one costs a few dict lookups.
+"""
+import contextvars
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Warn when the same statement runs this many times in one request (N+1 patterns)
+REPEATED_QUERY_THRESHOLD = int(os.getenv("REPEATED_QUERY_THRESHOLD", "10"))
+
+slow_log = logging.getLogger("db.slow")
+
+_current_stats = contextvars.ContextVar("current_query_stats", default=None)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+# Frames from these modules are skipped when looking for the caller of a query
+_INTERNAL_MODULES = ("instrumentation", "database", "contextlib", "asyncio", "aiomysql", "mysql")
+# Frames walked before giving up; the CRUD method is a few frames above execute()
+CALLER_MAX_DEPTH = 12
+
+# code object -> "module.qualname", or None for database plumbing
+_caller_names = {}
+
+def normalize_sql(query: str) -> str:
+    """Collapse whitespace and replace literals/placeholders with ?"""
+    query = _WHITESPACE_RE.sub(" ", query).strip()
+    query = _STRING_RE.sub("?", query)
+    query = query.replace("%s", "?")
+    query = _NUMBER_RE.sub("?", query)
+    return _PLACEHOLDER_LIST_RE.sub("(?+)", query)
+
+def _caller_name(frame):
+    code = frame.f_code
+    try:
+        return _caller_names[code]
+    except KeyError:
+        module = frame.f_globals.get("__name__", "")
+        name = None
+        if not module.startswith(_INTERNAL_MODULES):
+            name = f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+        _caller_names[code] = name
+        return name
+
+def find_caller() -> str:
+    """Name of the first function outside the database plumbing, e.g. async_crud.UserCRUD.get_user"""
+    frame = sys._getframe(1)
+    for _ in range(CALLER_MAX_DEPTH):
+        if frame is None:
+            break
+        name = _caller_name(frame)
+        if name is not None:
+            return name
+        frame = frame.f_back
+    return "unknown"
+
+class QueryRecord:
+    __slots__ = ("sql", "duration_ms", "rows", "caller")
+
+    def __init__(self, sql: str, duration_ms: float, rows: int, caller: str):
+        self.sql = sql
+        self.duration_ms = duration_ms
+        self.rows = rows
+        self.caller = caller
+
+    def to_dict(self):
+        return {
+            "sql": self.sql,
+            "duration_ms": round(self.duration_ms, 3),
+            "rows": self.rows,
+            "caller": self.caller
+        }
+
+class RequestQueryStats:
+    """All queries run while handling one request"""
+    def __init__(self):
+        self.queries = []
+        self.counts = Counter()
+        self.started = time.perf_counter()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_ms(self):
+        return sum(q.duration_ms for q in self.queries)
+
+    def add(self, record: QueryRecord):
+        self.queries.append(record)
+        self.counts[record.sql] += 1
+
+    def repeated_statements(self):
+        """[(sql, count, callers)] for statements that ran at least REPEATED_QUERY_THRESHOLD times"""
+        repeated = []
+        for sql, count in self.counts.most_common():
+            if count < REPEATED_QUERY_THRESHOLD:
+                break
+            callers = sorted({q.caller for q in self.queries if q.sql == sql})
+            repeated.append((sql, count, callers))
+        return repeated
+
+    def server_timing(self) -> str:
+        elapsed_ms = (time.perf_counter() - self.started) * 1000
+        return f'db;desc="{self.count} queries";dur={self.total_ms:.1f}, app;dur={elapsed_ms:.1f}'
+
+def start_request():
+    """Start collecting queries for the current request, returns (stats, token)"""
+    stats = RequestQueryStats()
+    return stats, _current_stats.set(stats)
+
+def end_request(token):
+    _current_stats.reset(token)
+
+def current_stats():
+    return _current_stats.get()
+
+def _record(query: str, start: float, rowcount: int):
+    duration_ms = (time.perf_counter() - start) * 1000
+    is_select = query.lstrip()[:6].upper() == "SELECT"
+    record = QueryRecord(
+        normalize_sql(query),
+        duration_ms,
+        0 if is_select else max(rowcount, 0),
+        find_caller()
+    )
+
+    if duration_ms >= SLOW_QUERY_MS:
+        slow_log.warning("%.1fms in %s (rowcount %s): %s", duration_ms, record.caller, rowcount, record.sql)
+
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.add(record)
+    return record
+
+class InstrumentedCursor:
+    """Wraps a mysql-connector cursor and records every statement it runs"""
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._last = None
+
+    def execute(self, query, params=None, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params, *args, **kwargs)
+        finally:
+            self._last = _record(query, start, self._cursor.rowcount)
+
+    def executemany(self, query, seq_params, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, seq_params, *args, **kwargs)
+        finally:
+            self._last = _record(query, start, self._cursor.rowcount)
+
+    def _count_rows(self, rows: int):
+        if self._last is not None:
+            self._last.rows += rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._count_rows(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._count_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._count_rows(len(rows))
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class AsyncInstrumentedCursor(InstrumentedCursor):
+    """Same as InstrumentedCursor for aiomysql cursors"""
+    async def execute(self, query, params=None, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await self._cursor.execute(query, params, *args, **kwargs)
+        finally:
+            self._last = _record(query, start, self._cursor.rowcount)
+
+    async def executemany(self, query, seq_params, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await self._cursor.executemany(query, seq_params, *args, **kwargs)
+        finally:
+            self._last = _record(query, start, self._cursor.rowcount)
+
+    async def fetchone(self):
+        row = await self._cursor.fetchone()
+        if row is not None:
+            self._count_rows(1)
+        return row
+
+    async def fetchmany(self, *args, **kwargs):
+        rows = await self._cursor.fetchmany(*args, **kwargs)
+        self._count_rows(len(rows))
+        return rows
+
+    async def fetchall(self):
+        rows = await self._cursor.fetchall()
+        self._count_rows(len(rows))
+        return rows
@@ -0,0 +1,260 @@
+"""
+Shared async LLM client for scenario generation and game summaries.
+
+One client (and its pool of keep-alive HTTP connections) is reused by every
+call, so a multi-second completion only suspends the request that is waiting
+for it instead of blocking the event loop. A global semaphore caps how many
+completions are in flight per worker, and every call has a deadline that
+covers both the wait for a slot and the request itself.
+
+The completions come from a provider chosen with LLM_PROVIDER: "openai", or
+"fake" for the offline provider in fake_llm.py used by load tests.
+
+Token spend is estimated from prompt and completion length (about
+CHARS_PER_TOKEN characters per token) the same way for every provider, the
+fake one reports no usage. Callers that budget tokens read it through a
+TokenMeter (see start_metering).
+"""
+import asyncio
+import contextvars
+import os
+from abc import ABC, abstractmethod
+import time
+import httpx
+from openai import AsyncOpenAI
+
+# Completions in flight at once per worker, the rest wait for a slot
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "256"))
+# Kept-alive HTTP connections to the provider
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", str(LLM_MAX_CONCURRENCY)))
+# Default deadline per call in seconds, including the wait for a slot
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+# Rough size of a token for the spend estimates
+CHARS_PER_TOKEN = 4
+
+_current_meter = contextvars.ContextVar("llm_token_meter", default=None)
+
+class LLMTimeout(Exception):
+    """Raised when a completion does not finish before its deadline"""
+    pass
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _prompt_tokens(kwargs: dict) -> int:
+    return sum(estimate_tokens(str(message.get("content", ""))) for message in kwargs.get("messages", []))
+
+class TokenMeter:
+    """Estimated tokens of the LLM calls made in the context it was started in"""
+    __slots__ = ("tokens",)
+
+    def __init__(self):
+        self.tokens = 0
+
+def start_metering() -> TokenMeter:
+    """
+    Meter the LLM calls of the current task from now on, including tasks it
+    starts afterwards. Call it at the top of a task of its own, the meter
+    stays set for the rest of that task.
+    """
+    meter = TokenMeter()
+    _current_meter.set(meter)
+    return meter
+
+class LLMProvider(ABC):
+    """Where completions come from, takes OpenAI chat completion kwargs"""
+    name = None
+
+    @abstractmethod
+    async def complete(self, **kwargs) -> str:
+        """Message content of a chat completion"""
+
+    @abstractmethod
+    def stream(self, **kwargs):
+        """Async generator of content deltas of a streamed chat completion"""
+
+    async def close(self):
+        pass
+
+    def stats(self):
+        return {}
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, max_connections: int = LLM_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        # Created lazily, it must bind to the running loop
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                # Deadlines and retries are handled by the caller, per call
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ))
+            )
+        return self._client
+
+    async def complete(self, **kwargs) -> str:
+        response = await self._get_client().chat.completions.create(**kwargs)
+        return response.choices[0].message.content
+
+    async def stream(self, **kwargs):
+        stream = await self._get_client().chat.completions.create(stream=True, **kwargs)
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Hand the HTTP connection back even if the consumer stopped early
+            await stream.response.aclose()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def stats(self):
+        return {"max_connections": self.max_connections}
+
+def create_provider(name: str = LLM_PROVIDER) -> LLMProvider:
+    if name == "openai":
+        return OpenAIProvider()
+    if name == "fake":
+        from fake_llm import FakeLLMProvider
+        return FakeLLMProvider()
+    raise ValueError(f"Unknown LLM_PROVIDER {name!r}, expected 'openai' or 'fake'")
+
+class LLMClient:
+    def __init__(self, provider: LLMProvider = None, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 timeout: float = LLM_TIMEOUT):
+        self.provider = provider if provider is not None else create_provider()
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        # Created lazily, it must bind to the running loop
+        self._semaphore = None
+
+        # Metrics
+        self._queued = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._timeouts = 0
+        self._errors = 0
+        self._tokens = 0
+        self._wait_time_total = 0.0
+        self._run_time_total = 0.0
+
+    def _spend(self, tokens: int):
+        """Count estimated tokens, the prompt as soon as it is sent and the completion as it arrives"""
+        self._tokens += tokens
+        meter = _current_meter.get()
+        if meter is not None:
+            meter.tokens += tokens
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def chat(self, timeout: float = None, **kwargs) -> str:
+        """Run a chat completion and return the message content"""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(self._chat(**kwargs), timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise LLMTimeout(f"LLM call did not finish within {timeout}s")
+
+    async def _chat(self, **kwargs) -> str:
+        semaphore = self._get_semaphore()
+        start = time.monotonic()
+        self._queued += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._queued -= 1
+
+        started = time.monotonic()
+        self._wait_time_total += started - start
+        self._in_flight += 1
+        self._spend(_prompt_tokens(kwargs))
+        try:
+            content = await self.provider.complete(**kwargs)
+            self._spend(estimate_tokens(content or ""))
+            return content
+        except Exception:
+            self._errors += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self._completed += 1
+            self._run_time_total += time.monotonic() - started
+            semaphore.release()
+
+    async def stream_chat(self, timeout: float = None, **kwargs):
+        """Async generator of content deltas of a streamed chat completion, same deadline as chat()"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        semaphore = self._get_semaphore()
+        start = time.monotonic()
+        self._queued += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise LLMTimeout(f"LLM call did not start within {timeout}s")
+        finally:
+            self._queued -= 1
+
+        started = time.monotonic()
+        self._wait_time_total += started - start
+        self._in_flight += 1
+        self._spend(_prompt_tokens(kwargs))
+        stream = self.provider.stream(**kwargs)
+        try:
+            while True:
+                try:
+                    delta = await asyncio.wait_for(stream.__anext__(), max(deadline - time.monotonic(), 0))
+                except StopAsyncIteration:
+                    break
+                self._spend(estimate_tokens(delta))
+                yield delta
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise LLMTimeout(f"LLM stream did not finish within {timeout}s")
+        except Exception:
+            self._errors += 1
+            raise
+        finally:
+            await stream.aclose()
+            self._in_flight -= 1
+            self._completed += 1
+            self._run_time_total += time.monotonic() - started
+            semaphore.release()
+
+    async def close(self):
+        await self.provider.close()
+
+    def stats(self):
+        return {
+            "provider": self.provider.name,
+            "max_concurrency": self.max_concurrency,
+            "timeout": self.timeout,
+            "queue_depth": self._queued,
+            "in_flight": self._in_flight,
+            "completed": self._completed,
+            "timeouts": self._timeouts,
+            "errors": self._errors,
+            "tokens_estimated": self._tokens,
+            "wait_time_avg_ms": round(self._wait_time_total * 1000 / self._completed, 3) if self._completed else 0.0,
+            "run_time_avg_ms": round(self._run_time_total * 1000 / self._completed, 3) if self._completed else 0.0,
+            "provider_stats": self.provider.stats()
+        }
+
+llm_client = LLMClient()
@@ -0,0 +1,251 @@
+"""
+Latency budgets and a circuit breaker for LLM calls.
+
+Each endpoint that calls the LLM has a budget: the total time it may spend
+on the call, retries included. An attempt that fails early is retried while
+budget is left, and with LLM_HEDGE_AFTER set a second attempt is started
+alongside one that is slow (hedging), whichever answers first wins.
+
+A circuit breaker shared by all budgets watches the provider. After
+LLM_BREAKER_FAILURES consecutive failures or exceeded budgets it opens and
+calls fail at once with CircuitOpen, so endpoints go straight to their
+fallback instead of waiting out the budget. After LLM_BREAKER_RESET seconds
+a single probe call is let through, and its outcome closes or reopens the
+breaker.
+"""
+import asyncio
+import os
+import time
+from llm import LLMTimeout, LLM_TIMEOUT
+
+# Seconds each endpoint may spend on its LLM call, retries included
+GROW_LATENCY_BUDGET = float(os.getenv("GROW_LATENCY_BUDGET", "25"))
+SUMMARY_LATENCY_BUDGET = float(os.getenv("SUMMARY_LATENCY_BUDGET", "20"))
+# Attempts per call within the budget
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "2"))
+# Start a hedged attempt when the first one has not answered after this many seconds, 0 disables
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+# Attempts are not started with less than this many seconds of budget left
+LLM_MIN_ATTEMPT_TIME = float(os.getenv("LLM_MIN_ATTEMPT_TIME", "2"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+class CircuitOpen(Exception):
+    """Raised instead of calling the LLM while the circuit breaker is open"""
+    pass
+
+class BudgetExceeded(LLMTimeout):
+    """Raised when no attempt answered within the latency budget"""
+    pass
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_timeout: float = LLM_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+        # Metrics
+        self._opened = 0
+        self._rejected = 0
+
+    @property
+    def state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            # One probe at a time decides whether the provider is back
+            self._state = self.HALF_OPEN
+            self._probing = True
+            return True
+        self._rejected += 1
+        return False
+
+    def record_success(self):
+        if self._state != self.CLOSED:
+            print("LLM circuit breaker closed")
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == self.HALF_OPEN or (self._state == self.CLOSED and self._failures >= self.failure_threshold):
+            print(f"LLM circuit breaker opened after {self._failures} failures")
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._opened += 1
+        self._probing = False
+
+    def abandon(self):
+        """The caller went away before the outcome was known"""
+        if self._state == self.HALF_OPEN:
+            self._probing = False
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout": self.reset_timeout,
+            "opened": self._opened,
+            "rejected": self._rejected
+        }
+
+class LatencyBudget:
+    def __init__(self, name: str, budget: float, breaker: CircuitBreaker, max_attempts: int = LLM_MAX_ATTEMPTS,
+                 hedge_after: float = LLM_HEDGE_AFTER, min_attempt_time: float = LLM_MIN_ATTEMPT_TIME):
+        self.name = name
+        self.budget = budget
+        self.breaker = breaker
+        self.max_attempts = max_attempts
+        self.hedge_after = hedge_after
+        self.min_attempt_time = min_attempt_time
+
+        # Metrics
+        self._calls = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._exceeded = 0
+        self._short_circuited = 0
+        self._retries = 0
+        self._hedges = 0
+        self._time_total = 0.0
+
+    def _check_breaker(self):
+        self._calls += 1
+        if not self.breaker.allow():
+            self._short_circuited += 1
+            raise CircuitOpen(f"LLM circuit breaker is open, skipping {self.name} call")
+
+    async def call(self, operation):
+        """
+        Result of operation(timeout) within the budget.
+
+        operation is called once per attempt with the seconds left, retried
+        on failure and hedged when slow. Raises CircuitOpen, BudgetExceeded or
+        the error of the last attempt.
+        """
+        self._check_breaker()
+        start = time.monotonic()
+        deadline = start + self.budget
+        attempts = set()
+        started = 0
+        last_error = None
+
+        def launch():
+            nonlocal started
+            started += 1
+            attempts.add(asyncio.ensure_future(operation(deadline - time.monotonic())))
+
+        launch()
+        try:
+            while attempts:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                can_start = started < self.max_attempts
+                hedge = can_start and self.hedge_after > 0
+                done, _ = await asyncio.wait(
+                    attempts,
+                    timeout=min(remaining, self.hedge_after) if hedge else remaining,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                attempts.difference_update(done)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        self._succeeded += 1
+                        self.breaker.record_success()
+                        return attempt.result()
+                    last_error = attempt.exception()
+
+                if not can_start or deadline - time.monotonic() < self.min_attempt_time:
+                    continue
+                if done and not attempts:
+                    self._retries += 1
+                    launch()
+                elif not done and hedge:
+                    self._hedges += 1
+                    launch()
+
+            if attempts or isinstance(last_error, (asyncio.TimeoutError, LLMTimeout)):
+                self._exceeded += 1
+                self.breaker.record_failure()
+                raise BudgetExceeded(f"{self.name} LLM call exceeded its {self.budget}s budget")
+            self._failed += 1
+            self.breaker.record_failure()
+            raise last_error
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            raise
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+            self._time_total += time.monotonic() - start
+
+    async def stream(self, open_stream):
+        """
+        Items of the async generator open_stream(timeout), limited to the budget.
+
+        Not retried, part of the answer may already have been used.
+        """
+        self._check_breaker()
+        start = time.monotonic()
+        try:
+            async for item in open_stream(self.budget):
+                yield item
+        except (asyncio.CancelledError, GeneratorExit):
+            self.breaker.abandon()
+            raise
+        except LLMTimeout:
+            self._exceeded += 1
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            self._failed += 1
+            self.breaker.record_failure()
+            raise
+        finally:
+            self._time_total += time.monotonic() - start
+        self._succeeded += 1
+        self.breaker.record_success()
+
+    def stats(self):
+        return {
+            "budget": self.budget,
+            "max_attempts": self.max_attempts,
+            "hedge_after": self.hedge_after or None,
+            "calls": self._calls,
+            "succeeded": self._succeeded,
+            "failed": self._failed,
+            "budget_exceeded": self._exceeded,
+            "short_circuited": self._short_circuited,
+            "retries": self._retries,
+            "hedges": self._hedges,
+            "time_avg_ms": round(self._time_total * 1000 / self._calls, 3) if self._calls else 0.0
+        }
+
+llm_breaker = CircuitBreaker()
+grow_budget = LatencyBudget("grow", GROW_LATENCY_BUDGET, llm_breaker)
+summary_budget = LatencyBudget("summary", SUMMARY_LATENCY_BUDGET, llm_breaker)
+# Nobody waits on the warm pool, one attempt up to the client timeout
+warm_pool_budget = LatencyBudget("warm_pool", LLM_TIMEOUT, llm_breaker, max_attempts=1)
+
+def budget_stats():
+    return {
+        "breaker": llm_breaker.stats(),
+        "budgets": {budget.name: budget.stats() for budget in (grow_budget, summary_budget, warm_pool_budget)}
+    }
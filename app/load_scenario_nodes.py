@@ -0,0 +1,49 @@
+"""
+Split learn scenarios into scenario_node rows (see migrations/0006_scenario_node.sql).
+
+    python load_scenario_nodes.py          # split scenarios that have no rows yet
+    python load_scenario_nodes.py --all    # re-split every scenario from scenario.info
+
+Scenarios whose info was cleared by a node edit are skipped, their rows are
+already the source of truth.
+"""
+import argparse
+import asyncio
+import json
+from async_crud import ScenarioCRUD
+from database import adb
+
+async def scenarios_to_split(split_all: bool):
+    async with adb.get_cursor() as (cursor, connection):
+        if split_all:
+            await cursor.execute("SELECT scenario_id FROM scenario WHERE info IS NOT NULL")
+        else:
+            await cursor.execute("""
+                SELECT s.scenario_id FROM scenario s
+                WHERE s.info IS NOT NULL
+                AND NOT EXISTS (SELECT 1 FROM scenario_node n WHERE n.scenario_id = s.scenario_id)
+            """)
+        return [row[0] for row in await cursor.fetchall()]
+
+async def load(split_all: bool = False):
+    scenario_ids = await scenarios_to_split(split_all)
+    for scenario_id in scenario_ids:
+        # One scenario at a time, so only one document is held in memory
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("SELECT info FROM scenario WHERE scenario_id = %s", (scenario_id,))
+            row = await cursor.fetchone()
+        if row and row[0]:
+            await ScenarioCRUD.store_scenario_nodes(scenario_id, json.loads(row[0]))
+    print(f"Split {len(scenario_ids)} scenarios into scenario_node rows")
+
+async def main(split_all: bool):
+    try:
+        await load(split_all)
+    finally:
+        adb.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split learn scenarios into scenario_node rows")
+    parser.add_argument("--all", action="store_true", help="re-split every scenario")
+    args = parser.parse_args()
+    asyncio.run(main(args.all))
@@ -1,6 +1,15 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from routers import auth, users, sessions, learn, grow, analytics
+from database import db, adb
+from cache import cache_stats
+from passwords import password_pool
+from write_behind import write_buffer
+from llm import llm_client
+from llm_budget import budget_stats
+from prompt_config import prompt_configs
+from generation_cache import generation_cache
+from middleware import UnitOfWorkMiddleware, QueryStatsMiddleware
 import os
 from dotenv import load_dotenv
 
@@ -21,6 +30,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# One database connection and transaction per request
+app.add_middleware(UnitOfWorkMiddleware)
+
+# Per-request query counts/timings in the Server-Timing header
+app.add_middleware(QueryStatsMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -41,6 +56,78 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/db")
+async def database_health():
+    """Live connection pool statistics"""
+    return {"pool": db.pool_stats(), "async_pool": adb.pool_stats()}
+
+@app.get("/health/cache")
+async def cache_health():
+    """Hit/miss statistics of the in-process caches"""
+    return cache_stats()
+
+@app.get("/health/passwords")
+async def password_health():
+    """Queue depth and latency of the password hashing workers"""
+    return password_pool.stats()
+
+@app.get("/health/llm")
+async def llm_health():
+    """Concurrency, latency and timeouts of LLM calls"""
+    return llm_client.stats()
+
+@app.get("/health/llm-budget")
+async def llm_budget_health():
+    """Circuit breaker state and per-endpoint latency budget outcomes"""
+    return budget_stats()
+
+@app.get("/health/prompt-config")
+async def prompt_config_health():
+    """Version, age and refresh failures of the cached Agenta prompt config"""
+    return prompt_configs.stats()
+
+@app.get("/health/generation-cache")
+async def generation_cache_health():
+    """Hits per tier and LLM time saved by the grow generation cache"""
+    return generation_cache.stats()
+
+@app.get("/health/generation-flights")
+async def generation_flights_health():
+    """Grow generations running and requests coalesced onto them"""
+    return grow.generation_flights.stats()
+
+@app.get("/health/warm-pool")
+async def warm_pool_health():
+    """Ready scenarios per (depth, trait_focus) and how fast the pool drains"""
+    return grow.warm_pool.stats()
+
+@app.get("/health/speculation")
+async def speculation_health():
+    """Hit rate and wasted generations of speculative grow pre-generation"""
+    return grow.speculator.stats()
+
+@app.get("/health/write-behind")
+async def write_behind_health():
+    """Pending and flushed buffered trait/counter writes"""
+    return write_buffer.stats()
+
+@app.on_event("startup")
+async def startup():
+    write_buffer.start()
+    prompt_configs.start()
+    grow.warm_pool.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Before the pools go away, pending writes need a connection
+    await write_buffer.stop()
+    await prompt_configs.stop()
+    await grow.warm_pool.stop()
+    db.dispose()
+    adb.dispose()
+    password_pool.shutdown()
+    await llm_client.close()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
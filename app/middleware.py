@@ -0,0 +1,64 @@
+import logging
+from database import adb
+from instrumentation import start_request, end_request
+
+repeated_log = logging.getLogger("db.repeated")
+
+class UnitOfWorkMiddleware:
+    """
+    Run every HTTP request inside a single database unit of work.
+
+    The transaction is committed (or rolled back for error responses) right
+    before the response starts, so a client never sees a response for writes
+    that are not visible to its next request yet. Handlers that await slow
+    external I/O call database.commit_now() first, so they do not hold a
+    pooled connection (and its locks) while they wait.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async with adb.unit_of_work() as uow:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    await uow.close(commit=message["status"] < 400)
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+class QueryStatsMiddleware:
+    """
+    Collect the queries run by each request and report them in a
+    Server-Timing header (query count and total database time).
+
+    Statements repeated REPEATED_QUERY_THRESHOLD times or more within one
+    request are written to the "db.repeated" logger, which is how N+1 loops
+    show up.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats, token = start_request()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            for sql, count, callers in stats.repeated_statements():
+                repeated_log.warning("%s %s ran %dx from %s: %s", scope["method"], scope["path"], count, ", ".join(callers), sql)
+            end_request(token)
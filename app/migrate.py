@@ -0,0 +1,118 @@
+"""
+Versioned schema migrations.
+
+Migrations are the numbered .sql files in migrations/ (e.g. 0002_hot_path_indexes.sql),
+applied in order and recorded in the schema_migrations table.
+
+    python migrate.py            # apply all pending migrations
+    python migrate.py --status   # list applied and pending migrations
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from database import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE_RE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+# How long to wait for MySQL to accept connections (e.g. on container start)
+DB_CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", "30"))
+
+def discover_migrations():
+    """Return [(version, name, path)] sorted by version"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    migrations.sort()
+
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("Duplicate migration version numbers in migrations/")
+    return migrations
+
+def split_statements(sql: str):
+    """Split a migration file into statements; `--` comments are dropped"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+def wait_for_database():
+    for attempt in range(DB_CONNECT_RETRIES):
+        try:
+            with db.get_cursor() as (cursor, connection):
+                cursor.execute("SELECT 1")
+                return
+        except Exception as e:
+            if attempt == DB_CONNECT_RETRIES - 1:
+                raise
+            print(f"Waiting for database ({e})")
+            time.sleep(1)
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def get_applied_versions():
+    with db.get_cursor() as (cursor, connection):
+        ensure_migrations_table(cursor)
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cursor.fetchall()}
+
+def migrate():
+    """Apply every pending migration, returns the versions that were applied"""
+    wait_for_database()
+    applied = get_applied_versions()
+    newly_applied = []
+
+    for version, name, path in discover_migrations():
+        if version in applied:
+            continue
+
+        with open(path) as f:
+            statements = split_statements(f.read())
+
+        print(f"Applying migration {version:04d}_{name} ({len(statements)} statements)")
+        # MySQL commits DDL implicitly, so a migration is only recorded once
+        # all of its statements went through
+        with db.get_cursor() as (cursor, connection):
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute("""
+                INSERT INTO schema_migrations (version, name)
+                VALUES (%s, %s)
+            """, (version, name))
+            connection.commit()
+        newly_applied.append(version)
+
+    if not newly_applied:
+        print("Database schema is up to date")
+    return newly_applied
+
+def status():
+    wait_for_database()
+    applied = get_applied_versions()
+    for version, name, path in discover_migrations():
+        state = "applied" if version in applied else "pending"
+        print(f"{version:04d}_{name}: {state}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    args = parser.parse_args()
+
+    try:
+        if args.status:
+            status()
+        else:
+            migrate()
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,97 @@
+-- Tables used by crud.py and the routers
+
+CREATE TABLE IF NOT EXISTS user_info (
+    userid INT AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(50) NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    hashpassword VARCHAR(255) NOT NULL,
+    trait_profile JSON,
+    game_played INT NOT NULL DEFAULT 0,
+    game_history JSON,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    UNIQUE KEY uq_user_info_username (username),
+    UNIQUE KEY uq_user_info_email (email)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS scenario (
+    scenario_id INT AUTO_INCREMENT PRIMARY KEY,
+    info JSON,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS scenario_metadata (
+    scenario_id INT PRIMARY KEY,
+    title VARCHAR(255),
+    description TEXT,
+    trait_focus VARCHAR(50),
+    difficulty VARCHAR(20),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_scenario_metadata_scenario FOREIGN KEY (scenario_id)
+        REFERENCES scenario (scenario_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS game_session (
+    session_id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    mode ENUM('learn', 'grow') NOT NULL,
+    scenario_id INT NULL,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    ended_at DATETIME NULL,
+    is_completed BOOLEAN NOT NULL DEFAULT FALSE,
+    CONSTRAINT fk_game_session_user FOREIGN KEY (user_id)
+        REFERENCES user_info (userid)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS user_choices (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    session_id INT NOT NULL,
+    depth INT NOT NULL,
+    choice_id VARCHAR(8) NOT NULL,
+    trait_impact VARCHAR(16) NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_user_choices_session FOREIGN KEY (session_id)
+        REFERENCES game_session (session_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS generated_scenarios (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    session_id INT NOT NULL,
+    depth INT NOT NULL,
+    scenario_json JSON NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_generated_scenarios_session FOREIGN KEY (session_id)
+        REFERENCES game_session (session_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS session_analytics (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    session_id INT NOT NULL,
+    total_choices INT NOT NULL DEFAULT 0,
+    average_response_time FLOAT NOT NULL DEFAULT 0,
+    trait_focus VARCHAR(50),
+    trait_changes JSON,
+    session_score INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_session_analytics_session FOREIGN KEY (session_id)
+        REFERENCES game_session (session_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS achievements (
+    achievement_id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    description TEXT,
+    criteria JSON,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS user_achievements (
+    user_id INT NOT NULL,
+    achievement_id INT NOT NULL,
+    unlocked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, achievement_id),
+    CONSTRAINT fk_user_achievements_user FOREIGN KEY (user_id)
+        REFERENCES user_info (userid),
+    CONSTRAINT fk_user_achievements_achievement FOREIGN KEY (achievement_id)
+        REFERENCES achievements (achievement_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
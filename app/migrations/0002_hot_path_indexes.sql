@@ -0,0 +1,126 @@
+-- Indexes for the access paths the CRUD layer runs on every request.
+--
+-- Every index is created only if it is missing (MySQL has no CREATE INDEX
+-- IF NOT EXISTS), so a migration that failed part way can be re-run.
+
+-- Login and registration look users up by username / email. 0001 declares
+-- unique keys for both, but on a database created by the old init.sql its
+-- CREATE TABLE IF NOT EXISTS did nothing, so add an index unless one
+-- already leads with the column.
+SET @stmt = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'user_info'
+       AND column_name = 'username' AND seq_in_index = 1) = 0,
+    'CREATE INDEX idx_user_info_username ON user_info (username)',
+    'DO 0'
+);
+PREPARE stmt FROM @stmt;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @stmt = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'user_info'
+       AND column_name = 'email' AND seq_in_index = 1) = 0,
+    'CREATE INDEX idx_user_info_email ON user_info (email)',
+    'DO 0'
+);
+PREPARE stmt FROM @stmt;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- SessionCRUD.get_user_sessions: WHERE user_id = ? ORDER BY started_at DESC
+SET @stmt = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'game_session'
+       AND index_name = 'idx_game_session_user_started') = 0,
+    'CREATE INDEX idx_game_session_user_started ON game_session (user_id, started_at)',
+    'DO 0'
+);
+PREPARE stmt FROM @stmt;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- SessionCRUD.get_user_sessions with a mode filter, AnalyticsCRUD.get_user_stats
+SET @stmt = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'game_session'
+       AND index_name = 'idx_game_session_user_mode') = 0,
+    'CREATE INDEX idx_game_session_user_mode ON game_session (user_id, mode, started_at)',
+    'DO 0'
+);
+PREPARE stmt FROM @stmt;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- Completed-session counts and AnalyticsCRUD.get_user_progress_over_time
+SET @stmt = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'game_session'
+       AND index_name = 'idx_game_session_user_completed') = 0,
+    'CREATE INDEX idx_game_session_user_completed ON game_session (user_id, is_completed, started_at)',
+    'DO 0'
+);
+PREPARE stmt FROM @stmt;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- AnalyticsCRUD.get_choice_analytics filtered by scenario
+SET @stmt = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'game_session'
+       AND index_name = 'idx_game_session_scenario') = 0,
+    'CREATE INDEX idx_game_session_scenario ON game_session (scenario_id)',
+    'DO 0'
+);
+PREPARE stmt FROM @stmt;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- ChoiceCRUD lookups by session ordered by depth; covers the trait_impact /
+-- choice_id aggregations in ChoiceCRUD.get_choice_impacts and AnalyticsCRUD
+SET @stmt = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'user_choices'
+       AND index_name = 'idx_user_choices_session_depth') = 0,
+    'CREATE INDEX idx_user_choices_session_depth ON user_choices (session_id, depth, choice_id, trait_impact)',
+    'DO 0'
+);
+PREPARE stmt FROM @stmt;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- GeneratedScenarioCRUD lookups by (session_id, depth)
+SET @stmt = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'generated_scenarios'
+       AND index_name = 'idx_generated_scenarios_session_depth') = 0,
+    'CREATE INDEX idx_generated_scenarios_session_depth ON generated_scenarios (session_id, depth)',
+    'DO 0'
+);
+PREPARE stmt FROM @stmt;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- AnalyticsCRUD.get_leaderboard: active users ordered by games played
+SET @stmt = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'user_info'
+       AND index_name = 'idx_user_info_active_played') = 0,
+    'CREATE INDEX idx_user_info_active_played ON user_info (is_active, game_played)',
+    'DO 0'
+);
+PREPARE stmt FROM @stmt;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @stmt = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'session_analytics'
+       AND index_name = 'idx_session_analytics_session') = 0,
+    'CREATE INDEX idx_session_analytics_session ON session_analytics (session_id)',
+    'DO 0'
+);
+PREPARE stmt FROM @stmt;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
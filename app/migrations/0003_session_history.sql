@@ -0,0 +1,25 @@
+-- Session histories move out of the user_info.game_history JSON blob into
+-- one row per (user_id, session_id).
+
+CREATE TABLE IF NOT EXISTS session_history (
+    user_id INT NOT NULL,
+    session_id INT NOT NULL,
+    history JSON NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, session_id),
+    CONSTRAINT fk_session_history_user FOREIGN KEY (user_id)
+        REFERENCES user_info (userid)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- One-time backfill: split every "session_<id>" key of the existing blobs
+-- into its own row. user_info.game_history is left in place but no longer
+-- read or written by the API.
+INSERT IGNORE INTO session_history (user_id, session_id, history)
+SELECT u.userid,
+       CAST(SUBSTRING(k.key_name, 9) AS UNSIGNED),
+       JSON_EXTRACT(u.game_history, CONCAT('$."', k.key_name, '"'))
+FROM user_info u,
+     JSON_TABLE(JSON_KEYS(u.game_history), '$[*]' COLUMNS (key_name VARCHAR(64) PATH '$')) k
+WHERE u.game_history IS NOT NULL
+  AND k.key_name REGEXP '^session_[0-9]+$';
@@ -0,0 +1,5 @@
+-- Covering index for the principal lookup in auth.get_principal_async:
+-- SELECT userid, username, is_active FROM user_info WHERE username = ?
+-- (userid comes along as the primary key), so authorization never touches
+-- the clustered row with its JSON columns.
+CREATE INDEX idx_user_info_principal ON user_info (username, is_active);
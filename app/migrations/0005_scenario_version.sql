@@ -0,0 +1,3 @@
+-- Bumped by ScenarioCRUD.update_scenario; parsed scenario trees are cached
+-- per (scenario_id, version) so every API worker notices edits.
+ALTER TABLE scenario ADD COLUMN version INT NOT NULL DEFAULT 1;
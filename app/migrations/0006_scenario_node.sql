@@ -0,0 +1,19 @@
+-- Learn scenarios stored one node per row, keyed by the choice path that
+-- leads to the node ('' is the root). Nodes are stored pruned: choices
+-- carry a next_path reference instead of the nested next_scenario subtree.
+-- Existing scenarios are split by `python load_scenario_nodes.py`.
+--
+-- scenario.info stays as the whole-document form for the legacy API; a
+-- single-node edit clears it and it is reassembled from these rows.
+
+CREATE TABLE IF NOT EXISTS scenario_node (
+    scenario_id INT NOT NULL,
+    path VARCHAR(255) CHARACTER SET ascii COLLATE ascii_bin NOT NULL,
+    depth INT NOT NULL,
+    node JSON NOT NULL,
+    -- JSON bytes of the subtrees replaced by next_path references
+    subtree_bytes INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (scenario_id, path),
+    CONSTRAINT fk_scenario_node_scenario FOREIGN KEY (scenario_id)
+        REFERENCES scenario (scenario_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
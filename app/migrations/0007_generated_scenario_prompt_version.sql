@@ -0,0 +1,3 @@
+-- Version id of the Agenta prompt config a grow scenario was generated
+-- with (NULL for fallback scenarios and rows from before this migration).
+ALTER TABLE generated_scenarios ADD COLUMN prompt_version VARCHAR(64) NULL;
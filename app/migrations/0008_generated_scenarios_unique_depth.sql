@@ -0,0 +1,12 @@
+-- One generated scenario per (session_id, depth). Double submits used to
+-- store a row per request; keep the first one.
+DELETE g FROM generated_scenarios g
+JOIN generated_scenarios first
+    ON first.session_id = g.session_id
+    AND first.depth = g.depth
+    AND first.id < g.id;
+
+-- Replaces the plain index from 0002 (it also backs the session foreign key)
+ALTER TABLE generated_scenarios
+    ADD UNIQUE KEY uq_generated_scenarios_session_depth (session_id, depth);
+DROP INDEX idx_generated_scenarios_session_depth ON generated_scenarios;
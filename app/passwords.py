@@ -0,0 +1,110 @@
+"""
+Password hashing and verification.
+
+bcrypt costs ~100ms of CPU per call, so the async API runs it in a dedicated
+process pool with a concurrency cap. A login storm then only queues up
+password work instead of freezing the event loop for every other request.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+# Password operations allowed in flight at once, the rest wait in line
+PASSWORD_MAX_CONCURRENCY = int(os.getenv("PASSWORD_MAX_CONCURRENCY", str(PASSWORD_WORKERS)))
+# Reject new password operations once this many are waiting (0 = unlimited)
+PASSWORD_MAX_QUEUE = int(os.getenv("PASSWORD_MAX_QUEUE", "100"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+class PasswordQueueFull(Exception):
+    """Raised when too many password operations are already waiting"""
+    pass
+
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+def get_password_hash(password):
+    return pwd_context.hash(password)
+
+class PasswordWorkerPool:
+    def __init__(self, workers: int = PASSWORD_WORKERS, max_concurrency: int = PASSWORD_MAX_CONCURRENCY,
+                 max_queue: int = PASSWORD_MAX_QUEUE):
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        # Created lazily, the semaphore must bind to the running loop
+        self._executor = None
+        self._semaphore = None
+
+        # Metrics
+        self._queued = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_time_total = 0.0
+        self._run_time_total = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn instead of fork: the API process has threads and an event loop running
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._executor
+
+    async def run(self, func, *args):
+        executor = self._get_executor()
+        if self.max_queue and self._queued >= self.max_queue:
+            self._rejected += 1
+            raise PasswordQueueFull(f"{self._queued} password operations already waiting")
+
+        start = time.monotonic()
+        self._queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._queued -= 1
+
+        started = time.monotonic()
+        self._wait_time_total += started - start
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, func, *args)
+        finally:
+            self._in_flight -= 1
+            self._completed += 1
+            self._run_time_total += time.monotonic() - started
+            self._semaphore.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_depth": self._queued,
+            "in_flight": self._in_flight,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "wait_time_avg_ms": round(self._wait_time_total * 1000 / self._completed, 3) if self._completed else 0.0,
+            "run_time_avg_ms": round(self._run_time_total * 1000 / self._completed, 3) if self._completed else 0.0
+        }
+
+password_pool = PasswordWorkerPool()
+
+async def verify_password_async(plain_password, hashed_password):
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await password_pool.run(get_password_hash, password)
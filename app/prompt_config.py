@@ -0,0 +1,188 @@
+"""
+Agenta prompt config for grow-mode generation, cached in process.
+
+The config used to be fetched from the Agenta registry on every generation.
+Now it is fetched once and refreshed in the background every
+PROMPT_CONFIG_TTL seconds, so prompt updates reach every worker within
+about one TTL. If a refresh fails the last good config keeps being served
+(stale-while-revalidate) and the refresh is retried.
+
+Each config carries a version id (a hash of its content) that is stored
+with the scenarios generated from it.
+
+With PROMPT_CONFIG_SOURCE=local (the default when LLM_PROVIDER=fake) the
+built-in LOCAL_PROMPT is used instead and Agenta is never contacted.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Get Agenta configuration from environment
+AGENTA_APP_SLUG = os.getenv("AGENTA_APP_SLUG", "test1")
+AGENTA_ENVIRONMENT_SLUG = os.getenv("AGENTA_ENVIRONMENT_SLUG", "development")
+
+# Seconds between background refreshes, and the age after which a read triggers one
+PROMPT_CONFIG_TTL = float(os.getenv("PROMPT_CONFIG_TTL", "60"))
+# "agenta" or "local"
+PROMPT_CONFIG_SOURCE = os.getenv("PROMPT_CONFIG_SOURCE", "local" if os.getenv("LLM_PROVIDER") == "fake" else "agenta")
+
+if PROMPT_CONFIG_SOURCE == "agenta":
+    # Set environment variables for Agenta
+    os.environ["AGENTA_API_KEY"] = os.getenv("AGENTA_API_KEY")
+    os.environ["AGENTA_HOST"] = os.getenv("AGENTA_HOST", "https://cloud.agenta.ai:443")
+
+    import agenta as ag
+    from agenta.sdk.types import PromptTemplate
+
+    # Initialize Agenta SDK
+    ag.init()
+
+# Offline stand-in for the Agenta prompt, same placeholders
+LOCAL_PROMPT = {
+    "model": "gpt-4o-mini",
+    "system": "You write scenes for a psychological thriller game. Answer with a single JSON object with the keys "
+              "depth, scene_narrative (list of {text, sfx}), narrative_purpose, personalization_notes, "
+              "choices (choice_id A/B/C, choice_text, maps_to_trait_details {trait, degree}, short_hidden_message) "
+              "and is_end.",
+    "user": "Depth: {depth}\nTrait focus: {trait_focus}\nPrevious choices: {previous_choices}\n"
+            "Games played: {game_played}\nTrait analysis: {trait_analysis}"
+}
+
+class LocalPrompt:
+    def __init__(self, model: str, system: str, user: str):
+        self.model = model
+        self.system = system
+        self.user = user
+
+    def format(self, **values):
+        return LocalPrompt(self.model, self.system, self.user.format(**values))
+
+    def to_openai_kwargs(self):
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.system},
+                {"role": "user", "content": self.user}
+            ]
+        }
+
+class PromptConfig:
+    __slots__ = ("template", "version", "fetched_at")
+
+    def __init__(self, template, version: str, fetched_at: float):
+        self.template = template
+        self.version = version
+        self.fetched_at = fetched_at
+
+def _config_version(config_dict: dict) -> str:
+    return hashlib.sha256(json.dumps(config_dict, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+def _fetch_prompt_config():
+    """Blocking registry call, run in a worker thread"""
+    if PROMPT_CONFIG_SOURCE == "local":
+        return PromptConfig(LocalPrompt(**LOCAL_PROMPT), _config_version(LOCAL_PROMPT), time.monotonic())
+
+    config_dict = ag.ConfigManager.get_from_registry(
+        app_slug=AGENTA_APP_SLUG,
+        environment_slug=AGENTA_ENVIRONMENT_SLUG
+    )
+    return PromptConfig(PromptTemplate(**config_dict['prompt']), _config_version(config_dict), time.monotonic())
+
+class PromptConfigCache:
+    def __init__(self, ttl: float = PROMPT_CONFIG_TTL):
+        self.ttl = ttl
+        self._config = None
+        # Created lazily, they must bind to the running loop
+        self._refresh_lock = None
+        self._task = None
+        self._refresh_task = None
+
+        # Metrics
+        self._hits = 0
+        self._stale_hits = 0
+        self._refreshes = 0
+        self._refresh_failures = 0
+        self._last_error = None
+
+    async def get(self) -> PromptConfig:
+        config = self._config
+        if config is None:
+            # Nothing to serve yet, wait for the first fetch
+            await self.refresh(raise_errors=True)
+            return self._config
+
+        if time.monotonic() - config.fetched_at > self.ttl:
+            self._stale_hits += 1
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.get_running_loop().create_task(self.refresh())
+        else:
+            self._hits += 1
+        return config
+
+    async def refresh(self, raise_errors: bool = False):
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+
+        started = time.monotonic()
+        async with self._refresh_lock:
+            # Someone else refreshed while we waited for the lock
+            if self._config is not None and self._config.fetched_at >= started:
+                return
+            try:
+                config = await asyncio.to_thread(_fetch_prompt_config)
+            except Exception as e:
+                self._refresh_failures += 1
+                self._last_error = str(e)
+                print(f"Prompt config refresh failed, serving cached version: {e}")
+                if raise_errors or self._config is None:
+                    raise
+                return
+
+            if self._config is not None and self._config.version != config.version:
+                print(f"Prompt config updated to version {config.version}")
+            self._config = config
+            self._refreshes += 1
+            self._last_error = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                # Already logged, retried on the next round
+                pass
+            await asyncio.sleep(self.ttl)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        config = self._config
+        return {
+            "source": PROMPT_CONFIG_SOURCE,
+            "version": config.version if config else None,
+            "age_seconds": round(time.monotonic() - config.fetched_at, 3) if config else None,
+            "ttl": self.ttl,
+            "hits": self._hits,
+            "stale_hits": self._stale_hits,
+            "refreshes": self._refreshes,
+            "refresh_failures": self._refresh_failures,
+            "last_error": self._last_error
+        }
+
+prompt_configs = PromptConfigCache()
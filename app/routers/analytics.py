@@ -1,37 +1,53 @@
 from fastapi import APIRouter, Depends, HTTPException
 from typing import Optional
 from schemas import GameStats, LeaderboardEntry
-from dependencies import get_current_active_user
-from crud import AnalyticsCRUD, ChoiceCRUD
+from dependencies import get_current_principal
+from async_crud import AnalyticsCRUD, ChoiceCRUD, SessionCRUD
 from typing import List
+import json
+import write_behind
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 @router.get("/user/{user_id}/stats", response_model=dict)
 async def get_user_stats(
     user_id: int,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """Get detailed statistics for a user"""
-    return AnalyticsCRUD.get_user_stats(user_id)
+    stats = await AnalyticsCRUD.get_user_stats(user_id)
+    user_data = stats["user_data"]
+    if user_data:
+        # Include trait/counter changes that are still buffered
+        current = write_behind.overlay({
+            "userid": user_id,
+            "game_played": user_data["game_played"],
+            "trait_profile": json.loads(user_data["trait_profile"]) if user_data["trait_profile"] else {}
+        })
+        stats["user_data"] = {
+            **user_data,
+            "game_played": current["game_played"],
+            "trait_profile": json.dumps(current["trait_profile"]) if user_data["trait_profile"] else user_data["trait_profile"]
+        }
+    return stats
 
 @router.get("/leaderboard", response_model=list)
 async def get_leaderboard(limit: int = 10):
     """Get top players leaderboard"""
-    return AnalyticsCRUD.get_leaderboard(limit)
+    return await AnalyticsCRUD.get_leaderboard(limit)
 
 @router.get("/choices/distribution", response_model=list)
 async def get_choice_distribution(scenario_id: Optional[int] = None):
     """Get distribution of choices made by all users"""
-    return AnalyticsCRUD.get_choice_analytics(scenario_id)
+    return await AnalyticsCRUD.get_choice_analytics(scenario_id)
 
 @router.get("/session/{session_id}/summary", response_model=dict)
 async def get_session_summary(
     session_id: int,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """Get summary of a specific session"""
-    choices = ChoiceCRUD.get_session_choices(session_id)
+    choices = await ChoiceCRUD.get_session_choices(session_id)
     
     # Calculate summary statistics
     trait_impacts = {"high": 0, "moderate": 0, "low": 0}
@@ -52,18 +68,18 @@ async def get_session_summary(
 @router.get("/traits/progression", response_model=dict)
 async def get_trait_progression(
     user_id: int,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """Get trait progression over time for a user"""
     if current_user["userid"] != user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
     # Get all sessions for user
-    sessions = SessionCRUD.get_user_sessions(user_id)
+    sessions = await SessionCRUD.get_user_sessions(user_id)
     
     progression = []
     for session in sessions:
-        choices = ChoiceCRUD.get_session_choices(session["session_id"])
+        choices = await ChoiceCRUD.get_session_choices(session["session_id"])
         
         # Calculate trait changes for this session
         trait_changes = {}
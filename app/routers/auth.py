@@ -2,21 +2,28 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 from schemas import Token, UserRegister, UserResponse
-from auth import authenticate_user, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
-from crud import UserCRUD
+from auth import authenticate_user_async, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from async_crud import UserCRUD
+from passwords import PasswordQueueFull
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 @router.post("/register", response_model=dict)
 async def register(user: UserRegister):
-    result = UserCRUD.create_user(user)
+    try:
+        result = await UserCRUD.create_user(user)
+    except PasswordQueueFull:
+        raise HTTPException(status_code=503, detail="Too many registrations in progress, try again shortly")
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
     return result
 
 @router.post("/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+    try:
+        user = await authenticate_user_async(form_data.username, form_data.password)
+    except PasswordQueueFull:
+        raise HTTPException(status_code=503, detail="Too many logins in progress, try again shortly")
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
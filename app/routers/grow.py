@@ -1,49 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from schemas import GenerateScenarioRequest, ScenarioResponse, ChoiceInput
-from dependencies import get_current_active_user
-from crud import SessionCRUD, GeneratedScenarioCRUD, ChoiceCRUD
-from openai import OpenAI
+from dependencies import get_current_active_user, get_current_principal
+from async_crud import SessionCRUD, GeneratedScenarioCRUD, ChoiceCRUD
+from database import commit_now
+from llm import llm_client
+from llm_budget import grow_budget, warm_pool_budget
 import os
 import json
 from typing import List
 from dotenv import load_dotenv
-
-import agenta as ag
-from agenta.sdk.types import PromptTemplate
+from prompt_config import prompt_configs
+from speculation import SpeculativeGenerator
+from streaming import PartialScenarioParser
+from generation_cache import generation_cache, fingerprint
+from singleflight import SingleFlight
+from warm_pool import WarmPool, WARM_POOL_LATENCY_BUDGET
+import time
+import asyncio
 
 # Load environment variables
 load_dotenv()
 
-# Set environment variables for Agenta and OpenAI
-os.environ["AGENTA_API_KEY"] = os.getenv("AGENTA_API_KEY")
-os.environ["AGENTA_HOST"] = os.getenv("AGENTA_HOST", "https://cloud.agenta.ai:443")
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
-
-# Get Agenta configuration from environment
-AGENTA_APP_SLUG = os.getenv("AGENTA_APP_SLUG", "test1")
-AGENTA_ENVIRONMENT_SLUG = os.getenv("AGENTA_ENVIRONMENT_SLUG", "development")
-
-# Initialize Agenta SDK
-ag.init()
-
-# Fetch prompt config from the registry for your app and variant
-config_dict = ag.ConfigManager.get_from_registry(
-    app_slug=AGENTA_APP_SLUG,
-    environment_slug=AGENTA_ENVIRONMENT_SLUG
-)
-
-# Build PromptTemplate object
-prompt_template = PromptTemplate(**config_dict['prompt'])
-
 router = APIRouter(prefix="/grow", tags=["grow"])
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 # Constants
 MAX_DEPTH = 5
 
-def generate_scenario_with_ai(depth: int, trait_focus: str, previous_choices: list, user_data: dict):
+async def build_prompt(depth: int, trait_focus: str, previous_choices: list, user_data: dict):
+    """OpenAI call kwargs for a grow scenario, and the prompt config they were built from"""
     trait_profile = user_data.get("trait_profile", {})
     game_history = user_data.get("game_history", {})
     game_played = user_data.get("game_played", 0)
@@ -60,15 +45,11 @@ def generate_scenario_with_ai(depth: int, trait_focus: str, previous_choices: li
         All Traits: {trait_profile}
         """
 
-    # Get prompt template from Agenta
-    config_dict = ag.ConfigManager.get_from_registry(
-        app_slug=AGENTA_APP_SLUG,
-        environment_slug=AGENTA_ENVIRONMENT_SLUG
-    )
-    prompt_template = PromptTemplate(**config_dict['prompt'])
+    # Get prompt template from Agenta (cached)
+    prompt_config = await prompt_configs.get()
 
     # Format Agenta prompt with your dynamic context
-    formatted_prompt = prompt_template.format(
+    formatted_prompt = prompt_config.template.format(
         depth=depth,
         trait_focus=trait_focus,
         previous_choices=previous_choices,
@@ -76,54 +57,134 @@ def generate_scenario_with_ai(depth: int, trait_focus: str, previous_choices: li
         trait_analysis=trait_analysis,
     )
 
-    # Call OpenAI with the structured prompt
-    client = OpenAI()
     kwargs = formatted_prompt.to_openai_kwargs()
     kwargs.pop("response_format", None)
+    return kwargs, prompt_config
 
-    try:
-        response = client.chat.completions.create(**kwargs)
-        content = response.choices[0].message.content
-        scenario_json = json.loads(content)
-
-        # Force is_end to True if we're at max depth
-        if depth >= MAX_DEPTH:
-            scenario_json["is_end"] = True
-
-        # Basic structure check
-        required_keys = ["depth", "scene_narrative", "choices", "is_end"]
-        if all(key in scenario_json for key in required_keys):
-            print(f"Generated scenario (depth {depth}, trait {trait_focus})")
-            return scenario_json
-        else:
-            raise ValueError("Missing required keys in AI response")
+def parse_scenario(content: str, depth: int):
+    """Scenario dict from the model's answer, raises ValueError if it is not a valid scenario"""
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.replace("```json", "").replace("```", "").strip()
+    scenario_json = json.loads(content)
+
+    # Force is_end to True if we're at max depth
+    if depth >= MAX_DEPTH:
+        scenario_json["is_end"] = True
+
+    # Basic structure check
+    required_keys = ["depth", "scene_narrative", "choices", "is_end"]
+    if not all(key in scenario_json for key in required_keys):
+        raise ValueError("Missing required keys in AI response")
+    return scenario_json
+
+def fallback_scenario(depth: int, trait_focus: str):
+    return {
+        "depth": depth,
+        "scene_narrative": [
+            {"text": f"You face a challenge that tests your {trait_focus}.", "sfx": "tension"},
+            {"text": "Your next move will shape your fate.", "sfx": "heartbeat"}
+        ],
+        "narrative_purpose": "Test fallback due to AI error",
+        "personalization_notes": "Fallback generation due to error",
+        "choices": [
+            {"choice_id": "A", "choice_text": "Act boldly", "maps_to_trait_details": {"trait": trait_focus, "degree": "high"}, "short_hidden_message": "Bold move"},
+            {"choice_id": "B", "choice_text": "Choose balance", "maps_to_trait_details": {"trait": trait_focus, "degree": "moderate"}, "short_hidden_message": "Balanced move"},
+            {"choice_id": "C", "choice_text": "Play safe", "maps_to_trait_details": {"trait": trait_focus, "degree": "low"}, "short_hidden_message": "Safe move"}
+        ],
+        "is_end": depth >= MAX_DEPTH
+    }
+
+async def _complete_and_cache(kwargs: dict, cache_key: str, depth: int, trait_focus: str):
+    # Call OpenAI with the structured prompt
+    start = time.perf_counter()
+    content = await grow_budget.call(lambda timeout: llm_client.chat(timeout=timeout, **kwargs))
+    scenario_json = parse_scenario(content, depth)
+    print(f"Generated scenario (depth {depth}, trait {trait_focus})")
+    await generation_cache.set(cache_key, scenario_json, (time.perf_counter() - start) * 1000)
+    return scenario_json
+
+def _ignore_result(task):
+    # Errors are already counted (LLM client) or passed on (flights)
+    if not task.cancelled():
+        task.exception()
+
+async def generate_scenario_with_ai(depth: int, trait_focus: str, previous_choices: list, user_data: dict,
+                                    use_pool: bool = False):
+    """
+    Returns (scenario, prompt config version), the version is None for the fallback scenario.
+    
+    With use_pool, a warm pool scenario is served if the LLM takes longer
+    than WARM_POOL_LATENCY_BUDGET or fails.
+    """
+    kwargs, prompt_config = await build_prompt(depth, trait_focus, previous_choices, user_data)
+
+    # Served from the cache when a similar player already got this scenario
+    cache_key = fingerprint(depth, trait_focus, previous_choices, user_data, prompt_config.version)
+    cached = await generation_cache.get(cache_key)
+    if cached is not None:
+        return cached, prompt_config.version
+
+    generation = asyncio.ensure_future(_complete_and_cache(kwargs, cache_key, depth, trait_focus))
+    if use_pool and warm_pool.enabled:
+        try:
+            done, _ = await asyncio.wait({generation}, timeout=WARM_POOL_LATENCY_BUDGET)
+        except asyncio.CancelledError:
+            generation.cancel()
+            raise
+        if not done:
+            pooled = warm_pool.take(depth, trait_focus, user_data)
+            if pooled is not None:
+                print(f"Serving warm pool scenario (depth {depth}, trait {trait_focus}), LLM over budget")
+                # Let it finish, the next similar player gets it from the cache
+                generation.add_done_callback(_ignore_result)
+                return pooled
 
+    try:
+        return await generation, prompt_config.version
     except Exception as e:
+        pooled = warm_pool.take(depth, trait_focus, user_data) if use_pool else None
+        if pooled is not None:
+            print(f"Serving warm pool scenario due to error: {e}")
+            return pooled
         print(f"Fallback due to error: {e}")
-        return {
-            "depth": depth,
-            "scene_narrative": [
-                {"text": f"You face a challenge that tests your {trait_focus}.", "sfx": "tension"},
-                {"text": "Your next move will shape your fate.", "sfx": "heartbeat"}
-            ],
-            "narrative_purpose": "Test fallback due to AI error",
-            "personalization_notes": "Fallback generation due to error",
-            "choices": [
-                {"choice_id": "A", "choice_text": "Act boldly", "maps_to_trait_details": {"trait": trait_focus, "degree": "high"}, "short_hidden_message": "Bold move"},
-                {"choice_id": "B", "choice_text": "Choose balance", "maps_to_trait_details": {"trait": trait_focus, "degree": "moderate"}, "short_hidden_message": "Balanced move"},
-                {"choice_id": "C", "choice_text": "Play safe", "maps_to_trait_details": {"trait": trait_focus, "degree": "low"}, "short_hidden_message": "Safe move"}
-            ],
-            "is_end": depth >= MAX_DEPTH
-        }
+        return fallback_scenario(depth, trait_focus), None
 
-@router.post("/scenario/{session_id}/generate", response_model=dict)
-async def generate_scenario(
-    session_id: int,
-    request: GenerateScenarioRequest,
-    current_user: dict = Depends(get_current_active_user)
-):
-    """Generate a personalized scenario for grow mode"""
-    session = SessionCRUD.get_session(session_id)
+async def generate_pool_scenario(depth: int, trait_focus: str):
+    """Scenario for a generic player, kept in the warm pool"""
+    kwargs, prompt_config = await build_prompt(depth, trait_focus, [], {})
+    content = await warm_pool_budget.call(lambda timeout: llm_client.chat(timeout=timeout, **kwargs))
+    return parse_scenario(content, depth), prompt_config.version
+
+def personalize_pooled(scenario: dict, user_data: dict):
+    """Light touch on a pooled scenario for the player it is served to"""
+    trait_profile = user_data.get("trait_profile") or {}
+    notes = f"Pre-generated for {user_data.get('username', 'Player')}"
+    if trait_profile:
+        strongest = max(trait_profile.items(), key=lambda x: x[1])
+        weakest = min(trait_profile.items(), key=lambda x: x[1])
+        notes += f", strongest {strongest[0]} ({strongest[1]}), weakest {weakest[0]} ({weakest[1]})"
+    scenario["personalization_notes"] = notes
+    for choice in scenario.get("choices", []):
+        details = choice.get("maps_to_trait_details")
+        trait = details.get("trait") if isinstance(details, dict) else None
+        if trait in trait_profile:
+            details["current_level"] = trait_profile[trait]
+    return scenario
+
+# Ready-made scenarios for requests over their latency budget (WARM_POOL_ENABLED=1)
+warm_pool = WarmPool(generate_pool_scenario, depths=range(1, MAX_DEPTH + 1))
+warm_pool.add_personalizer(personalize_pooled)
+
+# Pre-generates the next depth for every choice (SPECULATIVE_ENABLED=1)
+speculator = SpeculativeGenerator(generate_scenario_with_ai)
+
+# One generation per (session_id, depth) at a time, concurrent requests share it
+generation_flights = SingleFlight()
+
+async def _check_can_generate(session_id: int, request: GenerateScenarioRequest, current_user: dict):
+    """Validate a generate request, returns the stored scenario if this depth was already generated"""
+    session = await SessionCRUD.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -133,6 +194,13 @@ async def generate_scenario(
     if session["mode"] != "grow":
         raise HTTPException(status_code=400, detail="Not a grow session")
     
+    existing_scenarios = await GeneratedScenarioCRUD.get_all_generated_scenarios(session_id)
+    
+    # A repeated request (double click, rerun) gets what was stored the first time
+    stored = next((s for s in existing_scenarios if s["depth"] == request.depth), None)
+    if stored:
+        return stored
+    
     # Validate depth - prevent going beyond max depth
     if request.depth > MAX_DEPTH:
         raise HTTPException(
@@ -148,7 +216,6 @@ async def generate_scenario(
         )
     
     # Check if previous depth scenarios exist and if depth 5 was already reached
-    existing_scenarios = GeneratedScenarioCRUD.get_all_generated_scenarios(session_id)
     if existing_scenarios:
         max_existing_depth = max(s["depth"] for s in existing_scenarios)
         if max_existing_depth >= MAX_DEPTH:
@@ -159,51 +226,214 @@ async def generate_scenario(
                     status_code=400,
                     detail="Game has already ended. Cannot generate more scenarios."
                 )
-    
-    # Prepare user data for personalization
-    user_data = {
+    return None
+
+def _user_data(current_user: dict):
+    """User data for personalization"""
+    return {
         "trait_profile": current_user.get("trait_profile", {}),
         "game_history": current_user.get("game_history", {}),
         "game_played": current_user.get("game_played", 0),
         "username": current_user.get("username", "Player")
     }
-    
-    print(f"Generating personalized scenario for {user_data['username']} - Game #{user_data['game_played'] + 1}")
-    
-    # Generate personalized scenario using AI
-    scenario = generate_scenario_with_ai(
-        request.depth,
-        request.trait_focus,
-        request.previous_choices,
-        user_data
-    )
-    
+
+async def _store_generated(session_id: int, request: GenerateScenarioRequest, scenario: dict,
+                           prompt_version: str, user_data: dict):
+    """Save a generated scenario, returns the response body with the scenario that was stored"""
     # Save to database
-    result = GeneratedScenarioCRUD.save_generated_scenario(
+    result = await GeneratedScenarioCRUD.save_generated_scenario(
         session_id,
         request.depth,
-        scenario
+        scenario,
+        prompt_version
     )
+    if result.get("duplicate"):
+        # Another worker stored this depth first, serve that one
+        stored = await GeneratedScenarioCRUD.get_generated_scenario(session_id, request.depth)
+        return {"id": result["id"], "scenario": stored["scenario_json"]}
     
     # If this is the final scenario, mark the session as completed
     if scenario.get("is_end") or request.depth >= MAX_DEPTH:
         from datetime import datetime
-        SessionCRUD.update_session(session_id, datetime.utcnow(), True)
+        await SessionCRUD.update_session(session_id, datetime.utcnow(), True)
         print(f"Session {session_id} marked as completed at depth {request.depth}")
+    else:
+        speculator.schedule(session_id, request.depth, scenario, request.trait_focus, request.previous_choices, user_data)
     
-    return {
-        "id": result["id"],
-        "scenario": scenario
-    }
+    return {"id": result["id"], "scenario": scenario}
+
+@router.post("/scenario/{session_id}/generate", response_model=dict)
+async def generate_scenario(
+    session_id: int,
+    request: GenerateScenarioRequest,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Generate a personalized scenario for grow mode"""
+    stored = await _check_can_generate(session_id, request, current_user)
+    if stored:
+        return {"id": stored["id"], "scenario": stored["scenario_json"]}
+    user_data = _user_data(current_user)
+    
+    print(f"Generating personalized scenario for {user_data['username']} - Game #{user_data['game_played'] + 1}")
+    
+    # Hand the connection back before waiting on the LLM, the generation
+    # stores its result on a connection of its own
+    await commit_now()
+    return await generation_flights.run(
+        (session_id, request.depth),
+        lambda: _generate_and_store(session_id, request, user_data)
+    )
+
+async def _generate_and_store(session_id: int, request: GenerateScenarioRequest, user_data: dict):
+    # Use the scenario pre-generated for this choice, if any
+    speculated = await speculator.take(session_id, request.depth, request.trait_focus, request.previous_choices)
+    if speculated:
+        scenario, prompt_version = speculated
+    else:
+        # Generate personalized scenario using AI
+        scenario, prompt_version = await generate_scenario_with_ai(
+            request.depth,
+            request.trait_focus,
+            request.previous_choices,
+            user_data,
+            use_pool=True
+        )
+    
+    return await _store_generated(session_id, request, scenario, prompt_version, user_data)
+
+@router.post("/scenario/{session_id}/generate/stream")
+async def generate_scenario_stream(
+    session_id: int,
+    request: GenerateScenarioRequest,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Same as /generate, streamed as server-sent events.
+    
+    Emits a `narrative` event for each scene_narrative entry and a `choice`
+    event for each choice as soon as it has been generated. The final
+    `scenario` event carries the stored scenario and its id, the same body
+    /generate returns. A `fallback` event means generation failed and the
+    items sent so far should be discarded.
+    """
+    stored = await _check_can_generate(session_id, request, current_user)
+    user_data = _user_data(current_user)
+    
+    if stored:
+        body = _stored_events({"id": stored["id"], "scenario": stored["scenario_json"]})
+    else:
+        body = _stream_scenario(session_id, request, user_data)
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _scenario_events(scenario: dict):
+    """SSE events for a scenario that is already complete"""
+    for item in scenario.get("scene_narrative", []):
+        yield _sse("narrative", item)
+    for choice in scenario.get("choices", []):
+        yield _sse("choice", choice)
+
+async def _stored_events(result: dict):
+    for event in _scenario_events(result["scenario"]):
+        yield event
+    yield _sse("scenario", result)
+
+async def _stream_scenario(session_id: int, request: GenerateScenarioRequest, user_data: dict):
+    key = (session_id, request.depth)
+    running = generation_flights.join(key)
+    if running is not None:
+        # Same depth is already being generated, replay its result
+        async for event in _stored_events(await asyncio.shield(running)):
+            yield event
+        return
+    
+    flight = generation_flights.lead(key)
+    events = asyncio.Queue()
+    # Own task, so a client going away does not abandon the requests waiting on this flight
+    task = asyncio.get_running_loop().create_task(
+        _run_stream_generation(key, flight, events, session_id, request, user_data)
+    )
+    task.add_done_callback(_ignore_result)
+    while True:
+        event = await events.get()
+        if event is None:
+            break
+        yield event
+    # Surfaces a failure that ended the stream early
+    await task
+
+async def _run_stream_generation(key, flight, events: asyncio.Queue, session_id: int,
+                                 request: GenerateScenarioRequest, user_data: dict):
+    try:
+        async for event in _stream_generation(session_id, request, user_data):
+            if isinstance(event, dict):
+                generation_flights.finish(key, flight, event)
+                event = _sse("scenario", event)
+            events.put_nowait(event)
+    except BaseException as e:
+        generation_flights.fail(key, flight, e)
+        raise
+    finally:
+        # No-op once finished
+        generation_flights.fail(key, flight, RuntimeError("Streaming generation ended without a result"))
+        events.put_nowait(None)
+
+async def _stream_generation(session_id: int, request: GenerateScenarioRequest, user_data: dict):
+    """SSE events as they are generated, then the stored result as a dict"""
+    speculated = await speculator.take(session_id, request.depth, request.trait_focus, request.previous_choices)
+    if speculated:
+        scenario, prompt_version = speculated
+        for event in _scenario_events(scenario):
+            yield event
+    else:
+        try:
+            kwargs, prompt_config = await build_prompt(
+                request.depth,
+                request.trait_focus,
+                request.previous_choices,
+                user_data
+            )
+            cache_key = fingerprint(request.depth, request.trait_focus, request.previous_choices, user_data, prompt_config.version)
+            scenario = await generation_cache.get(cache_key)
+            if scenario is not None:
+                for event in _scenario_events(scenario):
+                    yield event
+            else:
+                parser = PartialScenarioParser()
+                start = time.perf_counter()
+                async for delta in grow_budget.stream(lambda timeout: llm_client.stream_chat(timeout=timeout, **kwargs)):
+                    for event, item in parser.feed(delta):
+                        yield _sse(event, item)
+                scenario = parse_scenario(parser.text, request.depth)
+                print(f"Generated scenario (depth {request.depth}, trait {request.trait_focus}, streamed)")
+                await generation_cache.set(cache_key, scenario, (time.perf_counter() - start) * 1000)
+            prompt_version = prompt_config.version
+        except Exception as e:
+            pooled = warm_pool.take(request.depth, request.trait_focus, user_data)
+            if pooled is not None:
+                print(f"Serving warm pool scenario due to error: {e}")
+                scenario, prompt_version = pooled
+            else:
+                print(f"Fallback due to error: {e}")
+                scenario, prompt_version = fallback_scenario(request.depth, request.trait_focus), None
+            yield _sse("fallback", {"detail": "Generation failed, using a fallback scenario"})
+    
+    yield await _store_generated(session_id, request, scenario, prompt_version, user_data)
 
 @router.get("/scenario/{session_id}/{depth}", response_model=dict)
 async def get_scenario(
     session_id: int,
     depth: int,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """Get generated scenario by depth"""
-    session = SessionCRUD.get_session(session_id)
+    session = await SessionCRUD.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -217,7 +447,7 @@ async def get_scenario(
             detail=f"Invalid depth. Maximum depth is {MAX_DEPTH}"
         )
     
-    scenario = GeneratedScenarioCRUD.get_generated_scenario(session_id, depth)
+    scenario = await GeneratedScenarioCRUD.get_generated_scenario(session_id, depth)
     if not scenario:
         raise HTTPException(status_code=404, detail="Scenario not found")
     
@@ -227,10 +457,10 @@ async def get_scenario(
 async def record_choice(
     session_id: int,
     choice: ChoiceInput,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """Record a user's choice in grow mode"""
-    session = SessionCRUD.get_session(session_id)
+    session = await SessionCRUD.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -251,7 +481,7 @@ async def record_choice(
             detail=f"Invalid depth. Maximum depth is {MAX_DEPTH}"
         )
     
-    result = ChoiceCRUD.record_choice(
+    result = await ChoiceCRUD.record_choice(
         session_id,
         choice.depth,
         choice.choice_id,
@@ -265,32 +495,32 @@ async def record_choice(
 @router.get("/scenarios/{session_id}", response_model=list)
 async def get_all_scenarios(
     session_id: int,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """Get all generated scenarios for a session"""
-    session = SessionCRUD.get_session(session_id)
+    session = await SessionCRUD.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
     if session["user_id"] != current_user["userid"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    return GeneratedScenarioCRUD.get_all_generated_scenarios(session_id)
+    return await GeneratedScenarioCRUD.get_all_generated_scenarios(session_id)
 
 @router.get("/session/{session_id}/status", response_model=dict)
 async def get_session_status(
     session_id: int,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """Get session status including completion state"""
-    session = SessionCRUD.get_session(session_id)
+    session = await SessionCRUD.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
     if session["user_id"] != current_user["userid"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    scenarios = GeneratedScenarioCRUD.get_all_generated_scenarios(session_id)
+    scenarios = await GeneratedScenarioCRUD.get_all_generated_scenarios(session_id)
     current_depth = len(scenarios)
     max_depth_reached = max([s["depth"] for s in scenarios]) if scenarios else 0
     
@@ -1,41 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
-from schemas import PathRequest, ChoiceInput, ScenarioResponse
-from dependencies import get_current_active_user
-from crud import ScenarioCRUD, SessionCRUD, ChoiceCRUD
-import json
-from typing import List
-from database import db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from schemas import PathRequest, ChoiceInput, StepInput, ScenarioResponse
+from dependencies import get_current_principal
+from async_crud import ScenarioCRUD, SessionCRUD, ChoiceCRUD
+import write_behind
+from typing import List, get_args
 router = APIRouter(prefix="/learn", tags=["learn"])
 
-def traverse_scenario_tree(scenario_info: dict, path: str):
-    """Navigate through nested scenario tree based on path"""
-    current = scenario_info
-    
-    for choice in path:
-        found = False
-        for c in current.get('choices', []):
-            if c['choice_id'] == choice:
-                if 'next_scenario' in c:
-                    current = c['next_scenario']
-                    found = True
-                    break
-        if not found:
-            raise HTTPException(status_code=400, detail=f"Invalid path: {path}")
-    
-    return current
+# Degrees POST /choice accepts as trait_impact
+TRAIT_IMPACTS = set(get_args(ChoiceInput.__annotations__["trait_impact"]))
 
 @router.get("/scenarios", response_model=List[dict])
 async def list_scenarios():
     """List all available learn scenarios"""
-    return ScenarioCRUD.list_scenarios()
+    return await ScenarioCRUD.list_scenarios()
 
 @router.get("/scenario/{session_id}/start", response_model=dict)
 async def get_start_scenario(
     session_id: int,
-    current_user: dict = Depends(get_current_active_user)
+    pruned: bool = Query(False, description="Replace next_scenario subtrees with child paths"),
+    current_user: dict = Depends(get_current_principal)
 ):
     """Get starting scenario for a session"""
-    session = SessionCRUD.get_session(session_id)
+    session = await SessionCRUD.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -45,57 +31,74 @@ async def get_start_scenario(
     if session["mode"] != "learn":
         raise HTTPException(status_code=400, detail="Not a learn session")
     
-    scenario = ScenarioCRUD.get_scenario(session["scenario_id"])
-    if not scenario:
+    node = await _get_node(session["scenario_id"], "", pruned)
+    if node is None:
         raise HTTPException(status_code=404, detail="Scenario not found")
     
-    return {
-        "session_id": session_id,
-        "current_path": "",
-        **scenario["info"]
-    }
+    return _node_response(session_id, node, pruned)
 
 @router.post("/scenario/{session_id}/by-path", response_model=dict)
 async def get_scenario_by_path(
     session_id: int,
     path_req: PathRequest,
-    current_user: dict = Depends(get_current_active_user)
+    pruned: bool = Query(False, description="Replace next_scenario subtrees with child paths"),
+    current_user: dict = Depends(get_current_principal)
 ):
     """Get scenario at specific path"""
-    session = SessionCRUD.get_session(session_id)
+    session = await SessionCRUD.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
     if session["user_id"] != current_user["userid"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    scenario = ScenarioCRUD.get_scenario(session["scenario_id"])
-    if not scenario:
-        raise HTTPException(status_code=404, detail="Scenario not found")
+    node = await _get_node(session["scenario_id"], path_req.path, pruned)
+    if node is None:
+        raise HTTPException(status_code=400, detail=f"Invalid path: {path_req.path}")
     
-    current_scenario = traverse_scenario_tree(scenario["info"], path_req.path)
+    return _node_response(session_id, node, pruned)
+
+async def _get_node(scenario_id: int, path: str, pruned: bool):
+    """Pruned responses only need the node's own row, full ones need the whole tree"""
+    if pruned:
+        return await ScenarioCRUD.get_scenario_node(scenario_id, path)
+    
+    scenario = await ScenarioCRUD.get_compiled_scenario(scenario_id)
+    return scenario.node_at(path) if scenario else None
+
+def _node_response(session_id: int, node, pruned: bool):
+    """Response body for one scenario node, optionally without its subtrees"""
+    if not pruned:
+        return {
+            "session_id": session_id,
+            "current_path": node.path,
+            **node.node
+        }
     
+    body, bytes_saved = node.pruned()
     return {
         "session_id": session_id,
-        "current_path": path_req.path,
-        **current_scenario
-   }
+        "current_path": node.path,
+        **body,
+        "pruned": True,
+        "bytes_saved": bytes_saved
+    }
 
 @router.post("/choice/{session_id}", response_model=dict)
 async def record_choice(
    session_id: int,
    choice: ChoiceInput,
-   current_user: dict = Depends(get_current_active_user)
+   current_user: dict = Depends(get_current_principal)
 ):
    """Record a user's choice"""
-   session = SessionCRUD.get_session(session_id)
+   session = await SessionCRUD.get_session(session_id)
    if not session:
        raise HTTPException(status_code=404, detail="Session not found")
    
    if session["user_id"] != current_user["userid"]:
        raise HTTPException(status_code=403, detail="Not authorized")
    
-   result = ChoiceCRUD.record_choice(
+   result = await ChoiceCRUD.record_choice(
        session_id,
        choice.depth,
        choice.choice_id,
@@ -103,14 +106,74 @@ async def record_choice(
    )
    
    # Update user traits based on choice
-   _update_user_traits(current_user["userid"], choice.trait_impact)
+   await _update_user_traits(current_user["userid"], choice.trait_impact)
    
    return result
 
-def _update_user_traits(user_id: int, trait_impact: str):
+@router.post("/step/{session_id}", response_model=dict)
+async def take_step(
+    session_id: int,
+    step: StepInput,
+    current_user: dict = Depends(get_current_principal)
+):
+    """
+    Make a choice at the node reached by `path` and return the next node.
+    
+    Replaces a POST /choice followed by a POST /scenario/{id}/by-path: the
+    choice is validated against the node, recorded and applied to the user's
+    traits in the request's single transaction. The next node is returned
+    pruned, as with ?pruned=true.
+    """
+    session = await SessionCRUD.get_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    if session["user_id"] != current_user["userid"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    if session["mode"] != "learn":
+        raise HTTPException(status_code=400, detail="Not a learn session")
+    
+    # Both nodes in one read; the child path is known before validating
+    next_path = step.path + step.choice_id
+    nodes = await ScenarioCRUD.get_scenario_nodes(session["scenario_id"], [step.path, next_path])
+    if nodes is None:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    
+    node = nodes.get(step.path)
+    if node is None:
+        raise HTTPException(status_code=400, detail=f"Invalid path: {step.path}")
+    
+    body, _ = node.pruned()
+    choice = next((c for c in body.get("choices", []) if c["choice_id"] == step.choice_id), None)
+    if node.is_end or choice is None:
+        raise HTTPException(status_code=400, detail=f"Invalid choice {step.choice_id} at path: {step.path}")
+    
+    # A missing degree counts as moderate, as the client used to send it to /choice
+    details = choice.get("maps_to_trait_details")
+    trait_impact = details.get("degree", "moderate") if isinstance(details, dict) else "moderate"
+    if trait_impact not in TRAIT_IMPACTS:
+        raise HTTPException(status_code=400, detail=f"Choice {step.choice_id} at path: {step.path} has an invalid trait impact: {trait_impact}")
+    
+    # The node's own depth, as clients recorded it through POST /choice
+    await ChoiceCRUD.record_choice(session_id, node.node.get("depth", node.depth), step.choice_id, trait_impact)
+    await _update_user_traits(current_user["userid"], trait_impact)
+    
+    next_node = nodes.get(next_path) if step.choice_id in node.child_paths else None
+    if next_node is None:
+        # The choice ends the story without a closing node
+        return {
+            "session_id": session_id,
+            "current_path": next_path,
+            "depth": node.depth + 1,
+            "scene_narrative": [],
+            "choices": [],
+            "is_end": True
+        }
+    return _node_response(session_id, next_node, True)
+
+async def _update_user_traits(user_id: int, trait_impact: str):
     """Update user traits based on choice impact"""
-    from database import db
-    import json
     
     impact_values = {
         "high": 10,
@@ -118,23 +181,6 @@ def _update_user_traits(user_id: int, trait_impact: str):
         "low": 2
     }
     
-    with db.get_cursor() as (cursor, connection):
-        # Get current trait profile
-        cursor.execute("SELECT trait_profile FROM user_info WHERE userid = %s", (user_id,))
-        result = cursor.fetchone()
-        
-        if result and result[0]:
-            trait_profile = json.loads(result[0])
-            
-            # Update all traits by the impact value (simplified)
-            # In real implementation, you'd update specific traits based on the scenario
-            for trait in trait_profile:
-                trait_profile[trait] = min(100, trait_profile[trait] + impact_values.get(trait_impact, 0))
-            
-            # Update the trait profile
-            cursor.execute("""
-                UPDATE user_info 
-                SET trait_profile = %s 
-                WHERE userid = %s
-            """, (json.dumps(trait_profile), user_id))
-            connection.commit()
\ No newline at end of file
+    # Update all traits by the impact value (simplified)
+    # In real implementation, you'd update specific traits based on the scenario
+    await write_behind.add_trait_deltas(user_id, {"*": impact_values.get(trait_impact, 0)})
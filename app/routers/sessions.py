@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
 from typing import List, Optional
 from schemas import SessionCreate, SessionResponse
-from dependencies import get_current_active_user
-from crud import SessionCRUD, ChoiceCRUD, GeneratedScenarioCRUD, ScenarioCRUD
-from database import db
+from dependencies import get_current_principal
+from async_crud import SessionCRUD, ChoiceCRUD, GeneratedScenarioCRUD, ScenarioCRUD, SessionHistoryCRUD
+from database import adb, commit_now
+import write_behind
 from datetime import datetime
 import json
 import time
-from openai import OpenAI
+from llm import llm_client
+from llm_budget import summary_budget
 import os
 from dotenv import load_dotenv
 
@@ -15,10 +17,7 @@ load_dotenv()
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 
-# Initialize OpenAI client for game summaries
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-def generate_game_summary(session_data: dict, user_data: dict) -> dict:
+async def generate_game_summary(session_data: dict, user_data: dict) -> dict:
     """
     Generate an AI-powered breakdown summary of the entire gameplay session
     Returns: dict with story_summary, trait_summary, genre, and genre_description
@@ -115,7 +114,9 @@ Requirements:
 """
         
         # Call OpenAI API
-        response = client.chat.completions.create(
+        # Within the summary latency budget, skipped while the provider is down
+        response_text = await summary_budget.call(lambda timeout: llm_client.chat(
+            timeout=timeout,
             model="gpt-4o-mini",
             messages=[
                 {
@@ -129,10 +130,10 @@ Requirements:
             ],
             max_tokens=400,
             temperature=0.7
-        )
+        ))
         
         # Parse the JSON response
-        response_text = response.choices[0].message.content.strip()
+        response_text = response_text.strip()
         
         # Clean up the response to ensure it's valid JSON
         if response_text.startswith("```json"):
@@ -155,10 +156,10 @@ Requirements:
 @router.post("/", response_model=dict)
 async def create_session(
     session: SessionCreate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """Create a new game session"""
-    result = SessionCRUD.create_session(
+    result = await SessionCRUD.create_session(
         current_user["userid"], 
         session.mode, 
         session.scenario_id
@@ -170,7 +171,7 @@ async def create_session(
 @router.get("/{session_id}", response_model=SessionResponse)
 async def get_session(session_id: int):
     """Get details for a specific session"""
-    session = SessionCRUD.get_session(session_id)
+    session = await SessionCRUD.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     return session
@@ -179,17 +180,17 @@ async def get_session(session_id: int):
 async def end_session(
     session_id: int,
     is_completed: bool = True,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """End a session and record comprehensive game history with AI-generated summary"""
     # Verify session belongs to user
-    session = SessionCRUD.get_session(session_id)
+    session = await SessionCRUD.get_session(session_id)
     if not session or session["user_id"] != current_user["userid"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
     # End the session
     end_time = datetime.utcnow()
-    result = SessionCRUD.update_session(
+    result = await SessionCRUD.update_session(
         session_id, 
         end_time, 
         is_completed
@@ -222,19 +223,19 @@ async def end_session(
             detailed_history = {}
             
             if session["mode"] == "learn":
-                detailed_history = build_learn_mode_history(session_id, session["scenario_id"])
+                detailed_history = await build_learn_mode_history(session_id, session["scenario_id"])
             else:  # grow mode
-                detailed_history = build_grow_mode_history(session_id)
+                detailed_history = await build_grow_mode_history(session_id)
             
             # Add session info to the detailed history
             detailed_history["session_info"] = session_info
             
             # Calculate result summary based on choices
-            results = calculate_session_results(session_id, current_user["userid"])
+            results = await calculate_session_results(session_id, current_user["userid"])
             detailed_history["results"] = results
             
             # Update user's game history (this will also generate the AI summary)
-            update_user_game_history(current_user["userid"], session_id, detailed_history)
+            await update_user_game_history(current_user["userid"], session_id, detailed_history)
             
         except Exception as e:
             # Log the error but still return success for the session update
@@ -246,80 +247,61 @@ async def end_session(
 async def get_user_sessions(
     user_id: int,
     mode: Optional[str] = None,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """Get all sessions for a user, optionally filtered by mode"""
     if current_user["userid"] != user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
-    return SessionCRUD.get_user_sessions(user_id, mode)
+    return await SessionCRUD.get_user_sessions(user_id, mode)
 
 # Helper functions for building detailed game history
 
-def build_learn_mode_history(session_id: int, scenario_id: int):
+async def build_learn_mode_history(session_id: int, scenario_id: int):
     """Build detailed history for a learn mode session"""
     history = {}
     
     # Get all choices made in this session
-    choices = ChoiceCRUD.get_session_choices(session_id)
+    choices = await ChoiceCRUD.get_session_choices(session_id)
     
     # Get the full scenario data
-    scenario_data = ScenarioCRUD.get_scenario(scenario_id)
-    if not scenario_data or not scenario_data["info"]:
+    scenario_data = await ScenarioCRUD.get_compiled_scenario(scenario_id)
+    if not scenario_data or not scenario_data.info:
         return history
     
-    scenario_info = scenario_data["info"]
-    
-    # Track the path through scenario tree
-    current_scenario = scenario_info
+    # Each choice was made at the node reached by the choices before it
+    node = scenario_data.node_at("")
     path = ""
     
     # Process each choice to build the full history
-    for i, choice in enumerate(sorted(choices, key=lambda x: x["depth"])):
+    for choice in sorted(choices, key=lambda x: x["depth"]):
         depth = choice["depth"]
         choice_id = choice["choice_id"]
         
-        # Add to path for navigating scenario tree
+        # Stay on the last valid node if the recorded path leaves the tree
+        node = scenario_data.node_at(path) or node
+        current_scenario = node.node
         path += choice_id
         
-        # Create depth entry if first choice
-        if i == 0:
-            history[f"depth{depth}"] = {
-                "scene_narrative": current_scenario.get("scene_narrative", []),
-                "narrative_purpose": current_scenario.get("narrative_purpose", ""),
-                "image_gen_prompt": current_scenario.get("image_gen_prompt", ""),
-                "choices": current_scenario.get("choices", []),
-                "choice_taken": choice_id,
-                "choice_timestamp": choice.get("recorded_at", "").isoformat() if choice.get("recorded_at") else "",
-            }
-        else:
-            # Navigate to next scenario based on previous choice
-            for c in current_scenario.get("choices", []):
-                if c["choice_id"] == path[-2]:  # previous choice
-                    if "next_scenario" in c:
-                        current_scenario = c["next_scenario"]
-                        break
-            
-            # Add this depth to history
-            history[f"depth{depth}"] = {
-                "scene_narrative": current_scenario.get("scene_narrative", []),
-                "narrative_purpose": current_scenario.get("narrative_purpose", ""),
-                "image_gen_prompt": current_scenario.get("image_gen_prompt", ""),
-                "choices": current_scenario.get("choices", []),
-                "choice_taken": choice_id,
-                "choice_timestamp": choice.get("recorded_at", "").isoformat() if choice.get("recorded_at") else "",
-            }
+        history[f"depth{depth}"] = {
+            "scene_narrative": current_scenario.get("scene_narrative", []),
+            "narrative_purpose": current_scenario.get("narrative_purpose", ""),
+            "image_gen_prompt": current_scenario.get("image_gen_prompt", ""),
+            "choices": current_scenario.get("choices", []),
+            "choice_taken": choice_id,
+            "choice_timestamp": choice.get("recorded_at", "").isoformat() if choice.get("recorded_at") else "",
+        }
     
     return history
 
-def build_grow_mode_history(session_id: int):
+async def build_grow_mode_history(session_id: int):
     """Build detailed history for a grow mode session"""
     history = {}
     
     # Get all generated scenarios for this session
-    scenarios = GeneratedScenarioCRUD.get_all_generated_scenarios(session_id)
+    scenarios = await GeneratedScenarioCRUD.get_all_generated_scenarios(session_id)
     
     # Get all choices made in this session
-    choices = ChoiceCRUD.get_session_choices(session_id)
+    choices = await ChoiceCRUD.get_session_choices(session_id)
     
     # Create mapping of choice by depth for easier lookup
     choice_map = {choice["depth"]: choice for choice in choices}
@@ -349,10 +331,10 @@ def build_grow_mode_history(session_id: int):
     
     return history
 
-def calculate_session_results(session_id: int, user_id: int):
+async def calculate_session_results(session_id: int, user_id: int):
     """Calculate result summary for the session - Enhanced with AI game summary"""
     # Get all choices made
-    choices = ChoiceCRUD.get_session_choices(session_id)
+    choices = await ChoiceCRUD.get_session_choices(session_id)
     
     # Track trait changes
     trait_changes = {}
@@ -407,58 +389,44 @@ def calculate_session_results(session_id: int, user_id: int):
         "game_summary": None  # Placeholder - will be filled in update_user_game_history
     }
 
-def update_user_game_history(user_id: int, session_id: int, detailed_history: dict):
-    """Update the user's game history with detailed session data - Enhanced with AI game summary"""
+async def update_user_game_history(user_id: int, session_id: int, detailed_history: dict):
+    """Store the detailed session data as the session's history row - Enhanced with AI game summary"""
     try:
-        with db.get_cursor() as (cursor, connection):
-            # Get current game history
-            cursor.execute("SELECT game_history FROM user_info WHERE userid = %s", (user_id,))
-            result = cursor.fetchone()
-            
-            if result and result[0]:
-                try:
-                    game_history = json.loads(result[0])
-                except Exception as e:
-                    print(f"Error parsing existing game history: {str(e)}")
-                    game_history = {}
-            else:
-                game_history = {}
-            
-            # Get user data for AI summary generation
-            cursor.execute("""
+        # Get user data for AI summary generation
+        async with adb.get_cursor() as (cursor, connection):
+            await cursor.execute("""
                 SELECT username, trait_profile, game_played 
                 FROM user_info 
                 WHERE userid = %s
             """, (user_id,))
-            user_result = cursor.fetchone()
-            
-            if user_result:
-                user_data = {
-                    "username": user_result[0],
-                    "trait_profile": json.loads(user_result[1]) if user_result[1] else {},
-                    "game_played": user_result[2]
-                }
-                
-                # Generate AI-powered game summary
-                print(f"Generating AI game summary for session {session_id}...")
-                game_summary = generate_game_summary(detailed_history, user_data)
-                
-                # Add the game summary to results
-                detailed_history["results"]["game_summary"] = game_summary
-                print(f"Added game summary to session {session_id}")
+            user_result = await cursor.fetchone()
+        
+        if user_result:
+            # Include trait/counter changes that are still buffered
+            user_data = write_behind.overlay({
+                "userid": user_id,
+                "username": user_result[0],
+                "trait_profile": json.loads(user_result[1]) if user_result[1] else {},
+                "game_played": user_result[2]
+            })
             
-            # Add new session data
-            game_history[f"session_{session_id}"] = detailed_history
+            # Don't hold a pooled connection (and the game_session row lock
+            # from update_session) while the summary is generated
+            await commit_now()
             
-            # Update in database
-            cursor.execute("""
-                UPDATE user_info 
-                SET game_history = %s, game_played = game_played + 1
-                WHERE userid = %s
-            """, (json.dumps(game_history), user_id))
-            connection.commit()
+            # Generate AI-powered game summary
+            print(f"Generating AI game summary for session {session_id}...")
+            game_summary = await generate_game_summary(detailed_history, user_data)
             
-            return True
+            # Add the game summary to results
+            detailed_history["results"]["game_summary"] = game_summary
+            print(f"Added game summary to session {session_id}")
+        
+        # Store the session as its own history row
+        await SessionHistoryCRUD.save_session_history(user_id, session_id, detailed_history)
+        await write_behind.increment_games_played(user_id)
+        
+        return True
     except Exception as e:
         print(f"Error updating game history: {str(e)}")
         return False
@@ -466,33 +434,23 @@ def update_user_game_history(user_id: int, session_id: int, detailed_history: di
 @router.get("/{session_id}/history", response_model=dict)
 async def get_session_history(
     session_id: int,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """Get detailed history for a specific session"""
     # Verify session belongs to user
-    session = SessionCRUD.get_session(session_id)
+    session = await SessionCRUD.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
     if session["user_id"] != current_user["userid"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # Get user's game history
-    with db.get_cursor() as (cursor, connection):
-        cursor.execute("SELECT game_history FROM user_info WHERE userid = %s", 
-                      (current_user["userid"],))
-        result = cursor.fetchone()
-        
-        if result and result[0]:
-            try:
-                game_history = json.loads(result[0])
-                session_key = f"session_{session_id}"
-                
-                if session_key in game_history:
-                    return {"history": game_history[session_key]}
-                else:
-                    return {"history": None, "message": "No history found for this session"}
-            except:
-                pass
+    # Get the session's history row
+    try:
+        history = await SessionHistoryCRUD.get_session_history(current_user["userid"], session_id)
+    except Exception:
+        return {"history": None, "message": "Failed to retrieve session history"}
     
-    return {"history": None, "message": "Failed to retrieve session history"}
\ No newline at end of file
+    if history is not None:
+        return {"history": history}
+    return {"history": None, "message": "No history found for this session"}
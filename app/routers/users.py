@@ -1,43 +1,48 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List
 from schemas import UserResponse, UserUpdate
-from dependencies import get_current_active_user
-from crud import UserCRUD
+from dependencies import get_current_active_user, get_current_principal
+from async_crud import UserCRUD, SessionHistoryCRUD
+import write_behind
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.get("/me", response_model=UserResponse)
 async def read_users_me(current_user: dict = Depends(get_current_active_user)):
-    return current_user
+    # current_user already includes buffered changes
+    return {
+        **current_user,
+        "game_history": await SessionHistoryCRUD.get_user_history(current_user["userid"])
+    }
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def read_user(user_id: int):
-    user = UserCRUD.get_user(user_id)
+    user = await UserCRUD.get_user(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return write_behind.overlay(user)
 
 @router.patch("/{user_id}", response_model=dict)
 async def update_user(
     user_id: int, 
     user_update: UserUpdate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     if current_user["userid"] != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to update this user")
-    result = UserCRUD.update_user(user_id, user_update)
+    result = await UserCRUD.update_user(user_id, user_update)
     return result
 
 @router.delete("/{user_id}", response_model=dict)
 async def delete_user(
     user_id: int,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     if current_user["userid"] != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this user")
-    result = UserCRUD.delete_user(user_id)
+    result = await UserCRUD.delete_user(user_id)
     return result
 
 @router.get("/", response_model=List[dict])
 async def list_users(skip: int = 0, limit: int = 100):
-    return UserCRUD.get_all_users(skip, limit)
\ No newline at end of file
+    return await UserCRUD.get_all_users(skip, limit)
\ No newline at end of file
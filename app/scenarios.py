@@ -0,0 +1,140 @@
+"""
+Parsed learn-mode scenario trees, cached per (scenario_id, version).
+
+Scenarios are effectively immutable, so instead of reading and parsing the
+full `scenario.info` JSON on every step, each version is parsed once and
+shared by all requests in the process. Each compiled scenario also carries
+a flat index from path string ("", "A", "AB", ...) to node, so looking up
+the node for a path is a single dictionary hit. Cached trees must be
+treated as read-only.
+
+Nodes can also be served pruned: every choice's `next_scenario` subtree is
+replaced by the path it leads to, so a step only ships the current node
+instead of the whole remaining story. That pruned form is also what the
+scenario_node table stores, one row per (scenario_id, path); split_scenario
+and assemble_scenario convert between it and the nested `info` document.
+"""
+import json
+import os
+from cache import LRUCache
+
+SCENARIO_CACHE_SIZE = int(os.getenv("SCENARIO_CACHE_SIZE", "256"))
+# Approximate memory cap, measured in bytes of scenario JSON
+SCENARIO_CACHE_MAX_BYTES = int(os.getenv("SCENARIO_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+scenario_cache = LRUCache("scenario", maxsize=SCENARIO_CACHE_SIZE, max_weight=SCENARIO_CACHE_MAX_BYTES)
+
+class ScenarioNode:
+    """One node of a scenario tree with its position precomputed"""
+    __slots__ = ("path", "depth", "node", "child_paths", "is_end", "_pruned", "_bytes_saved")
+
+    def __init__(self, path: str, node: dict, child_paths: dict):
+        self.path = path
+        self.depth = len(path) + 1
+        self.node = node
+        # choice_id -> path of the node that choice leads to
+        self.child_paths = child_paths
+        self.is_end = node.get("is_end", not child_paths)
+        self._pruned = None
+        self._bytes_saved = 0
+
+    @classmethod
+    def from_stored(cls, path: str, node: dict, bytes_saved: int):
+        """Node read from scenario_node, which is already pruned"""
+        child_paths = {c["choice_id"]: c["next_path"] for c in node.get("choices", []) if "next_path" in c}
+        stored = cls(path, node, child_paths)
+        stored._pruned = node
+        stored._bytes_saved = bytes_saved
+        return stored
+
+    def pruned(self):
+        """
+        Copy of the node with child subtrees replaced by references, and the
+        number of JSON bytes that saves. Computed once per node and shared.
+        """
+        if self._pruned is None:
+            pruned = strip_subtrees(self.node, self.child_paths)
+            self._bytes_saved = max(_json_size(self.node) - _json_size(pruned), 0)
+            self._pruned = pruned
+        return self._pruned, self._bytes_saved
+
+def strip_subtrees(node: dict, child_paths: dict):
+    """Copy of node with each choice's next_scenario replaced by its next_path"""
+    if "choices" not in node:
+        return dict(node)
+
+    choices = []
+    for choice in node["choices"]:
+        choice = {key: value for key, value in choice.items() if key not in ("next_scenario", "next_path")}
+        if choice["choice_id"] in child_paths:
+            choice["next_path"] = child_paths[choice["choice_id"]]
+        choices.append(choice)
+    return {**node, "choices": choices}
+
+def _json_size(value) -> int:
+    # Same encoding as FastAPI's JSONResponse
+    return len(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+def build_path_index(info: dict):
+    """Flatten a nested scenario tree into {path: ScenarioNode}"""
+    index = {}
+    stack = [("", info)]
+    while stack:
+        path, node = stack.pop()
+        child_paths = {}
+        for choice in node.get("choices", []):
+            # First matching choice wins, like the old tree walk
+            if "next_scenario" in choice and choice["choice_id"] not in child_paths:
+                child_path = path + choice["choice_id"]
+                child_paths[choice["choice_id"]] = child_path
+                stack.append((child_path, choice["next_scenario"]))
+        index[path] = ScenarioNode(path, node, child_paths)
+    return index
+
+def split_scenario(info: dict):
+    """[(path, depth, pruned node, bytes saved)] for every node of a scenario tree"""
+    rows = []
+    for path, node in build_path_index(info).items():
+        pruned, bytes_saved = node.pruned()
+        rows.append((path, node.depth, pruned, bytes_saved))
+    return rows
+
+def assemble_scenario(nodes: dict):
+    """Rebuild the nested `info` document from {path: pruned node}"""
+    if "" not in nodes:
+        return {}
+
+    # Fresh copies so the stored nodes are not modified
+    copies = {path: dict(node) for path, node in nodes.items()}
+    for node in copies.values():
+        if "choices" not in node:
+            continue
+        node["choices"] = [dict(choice) for choice in node["choices"]]
+        for choice in node["choices"]:
+            next_path = choice.pop("next_path", None)
+            if next_path in copies:
+                choice["next_scenario"] = copies[next_path]
+    return copies[""]
+
+class CompiledScenario:
+    def __init__(self, scenario_id: int, version: int, info: dict, size: int):
+        self.scenario_id = scenario_id
+        self.version = version
+        self.info = info
+        self.size = size
+        self.nodes = build_path_index(info)
+
+    def node_at(self, path: str):
+        """ScenarioNode for a path, None if the path does not exist"""
+        return self.nodes.get(path)
+
+def get_cached_scenario(scenario_id: int, version: int):
+    return scenario_cache.get((scenario_id, version))
+
+def cache_scenario(scenario_id: int, version: int, info: dict, size: int):
+    compiled = CompiledScenario(scenario_id, version, info, size)
+    scenario_cache.set((scenario_id, version), compiled, weight=size)
+    return compiled
+
+def invalidate_scenario(scenario_id: int):
+    scenario_cache.invalidate_where(lambda key, compiled: key[0] == scenario_id)
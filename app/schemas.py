@@ -81,6 +81,10 @@ class ChoiceInput(BaseModel):
     choice_id: Literal["A", "B", "C"]
     trait_impact: Literal["high", "moderate", "low"]
 
+class StepInput(BaseModel):
+    path: str = ""
+    choice_id: Literal["A", "B", "C"]
+
 # Grow Module Schemas
 class GenerateScenarioRequest(BaseModel):
     depth: int
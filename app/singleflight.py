@@ -0,0 +1,78 @@
+"""
+Coalesce concurrent identical operations into one.
+
+The first caller for a key runs the operation in its own task. Callers that
+arrive while it is running wait for the same result instead of starting it
+again. The operation keeps running if a waiter goes away, so the others
+still get their result.
+
+Callers that drive the operation themselves use lead()/finish()/fail() and
+must run it in a task of its own for the same guarantee.
+"""
+import asyncio
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}  # key -> future
+
+        # Metrics
+        self._started = 0
+        self._coalesced = 0
+
+    async def run(self, key, operation):
+        """Result of operation() for key, shared with concurrent callers"""
+        future = self.join(key)
+        if future is None:
+            future = self.lead(key)
+            task = asyncio.get_running_loop().create_task(operation())
+            task.add_done_callback(lambda done: self._finish_from_task(key, future, done))
+        return await asyncio.shield(future)
+
+    def join(self, key):
+        """Future of the operation running for key, None if there is none"""
+        future = self._flights.get(key)
+        if future is not None:
+            self._coalesced += 1
+        return future
+
+    def lead(self, key):
+        """
+        Register the caller as the one running the operation. Returns the
+        future waiters get, which must be passed to finish() or fail().
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._flights[key] = future
+        self._started += 1
+        return future
+
+    def _forget(self, key, future):
+        # A later flight may have taken over the key, leave it alone
+        if self._flights.get(key) is future:
+            del self._flights[key]
+
+    def finish(self, key, future, result):
+        self._forget(key, future)
+        if not future.done():
+            future.set_result(result)
+
+    def fail(self, key, future, error: BaseException):
+        self._forget(key, future)
+        if not future.done():
+            future.set_exception(error)
+            # Nobody may be waiting, don't warn about an unretrieved exception
+            future.exception()
+
+    def _finish_from_task(self, key, future, task):
+        if task.cancelled():
+            self.fail(key, future, asyncio.CancelledError())
+        elif task.exception() is not None:
+            self.fail(key, future, task.exception())
+        else:
+            self.finish(key, future, task.result())
+
+    def stats(self):
+        return {
+            "in_flight": len(self._flights),
+            "started": self._started,
+            "coalesced": self._coalesced
+        }
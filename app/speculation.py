@@ -0,0 +1,199 @@
+"""
+Speculative pre-generation of grow scenarios.
+
+As soon as the scenario for depth N is served, the scenario for depth N+1 is
+generated in the background for each of its choices. The results are kept
+in memory as candidates keyed by (session_id, depth, choice_id). When the
+player picks a choice, the generate endpoint serves the matching candidate,
+or waits for it if it is still running, and discards the others.
+
+Speculation multiplies LLM spend, so it is off by default and bounded per
+worker by SPECULATIVE_MAX_IN_FLIGHT concurrent generations and by
+SPECULATIVE_MAX_TOKENS_PER_MINUTE tokens spent on speculation over the last
+minute. Tokens are the LLM client's estimates (see llm.TokenMeter); the
+generations still running are counted at the average cost of the finished
+ones, so a burst cannot start far past the budget. Tokens spent on
+candidates that are discarded, cancelled or failed are reported as wasted.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from cache import LRUCache
+from llm import start_metering
+
+SPECULATIVE_ENABLED = os.getenv("SPECULATIVE_ENABLED", "0") == "1"
+SPECULATIVE_MAX_IN_FLIGHT = int(os.getenv("SPECULATIVE_MAX_IN_FLIGHT", "16"))
+SPECULATIVE_MAX_TOKENS_PER_MINUTE = int(os.getenv("SPECULATIVE_MAX_TOKENS_PER_MINUTE", "150000"))
+# Unused candidates are dropped after this many seconds
+SPECULATIVE_TTL = float(os.getenv("SPECULATIVE_TTL", "600"))
+SPECULATIVE_CACHE_SIZE = int(os.getenv("SPECULATIVE_CACHE_SIZE", "3000"))
+
+class Candidate:
+    __slots__ = ("trait_focus", "previous_choices", "scenario", "prompt_version", "tokens")
+
+    def __init__(self, trait_focus: str, previous_choices: tuple, scenario: dict, prompt_version: str,
+                 tokens: int = 0):
+        self.trait_focus = trait_focus
+        self.previous_choices = previous_choices
+        self.scenario = scenario
+        self.prompt_version = prompt_version
+        self.tokens = tokens
+
+    def matches(self, trait_focus: str, previous_choices: tuple):
+        return self.trait_focus == trait_focus and self.previous_choices == previous_choices
+
+class SpeculativeGenerator:
+    def __init__(self, generate, enabled: bool = SPECULATIVE_ENABLED, max_in_flight: int = SPECULATIVE_MAX_IN_FLIGHT,
+                 max_tokens_per_minute: int = SPECULATIVE_MAX_TOKENS_PER_MINUTE):
+        # generate(depth, trait_focus, previous_choices, user_data) -> (scenario, prompt_version)
+        self._generate = generate
+        self.enabled = enabled
+        self.max_in_flight = max_in_flight
+        self.max_tokens_per_minute = max_tokens_per_minute
+
+        self._candidates = LRUCache("grow_candidates", maxsize=SPECULATIVE_CACHE_SIZE, ttl=SPECULATIVE_TTL)
+        self._in_flight = {}  # key -> (trait_focus, previous_choices, task)
+        self._spent = deque()  # (finish time, tokens) within the last minute
+        self._window_tokens = 0
+
+        # Metrics
+        self._scheduled = 0
+        self._throttled = 0
+        self._failed = 0
+        self._hits = 0
+        self._joined = 0
+        self._misses = 0
+        self._wasted = 0
+        self._finished = 0
+        self._tokens = 0
+        self._tokens_wasted = 0
+
+    def _has_budget(self):
+        if len(self._in_flight) >= self.max_in_flight:
+            return False
+        self._expire_spent()
+        average = self._tokens / self._finished if self._finished else 0
+        return self._window_tokens + (len(self._in_flight) + 1) * average <= self.max_tokens_per_minute
+
+    def _expire_spent(self):
+        now = time.monotonic()
+        while self._spent and now - self._spent[0][0] > 60:
+            self._window_tokens -= self._spent.popleft()[1]
+
+    def _record_spend(self, tokens: int, wasted: bool):
+        self._spent.append((time.monotonic(), tokens))
+        self._window_tokens += tokens
+        self._finished += 1
+        self._tokens += tokens
+        if wasted:
+            self._tokens_wasted += tokens
+
+    def schedule(self, session_id: int, depth: int, scenario: dict, trait_focus: str, previous_choices: list,
+                 user_data: dict):
+        """Start generating depth + 1 for every choice of the scenario just served at depth"""
+        if not self.enabled or scenario.get("is_end"):
+            return
+
+        depth += 1
+        for choice in scenario.get("choices", []):
+            key = (session_id, depth, choice["choice_id"])
+            if key in self._in_flight or self._candidates.get(key) is not None:
+                continue
+            if not self._has_budget():
+                self._throttled += 1
+                continue
+
+            choices = tuple(previous_choices) + (choice["choice_id"],)
+            task = asyncio.get_running_loop().create_task(self._run(key, trait_focus, choices, user_data))
+            self._in_flight[key] = (trait_focus, choices, task)
+            self._scheduled += 1
+
+    async def _run(self, key, trait_focus: str, previous_choices: tuple, user_data: dict):
+        # Runs in its own task, so the meter only sees this generation's calls
+        meter = start_metering()
+        candidate = None
+        try:
+            scenario, prompt_version = await self._generate(key[1], trait_focus, list(previous_choices), user_data)
+            if prompt_version is None:
+                # Fallback scenario, let the real request try the LLM again
+                self._failed += 1
+                return None
+            candidate = Candidate(trait_focus, previous_choices, scenario, prompt_version, meter.tokens)
+            self._candidates.set(key, candidate)
+            return candidate
+        except Exception as e:
+            self._failed += 1
+            print(f"Speculative generation failed for {key}: {e}")
+            return None
+        finally:
+            # Failed and cancelled generations are wasted, candidates once discarded (see _discard)
+            self._record_spend(meter.tokens, wasted=candidate is None)
+            self._in_flight.pop(key, None)
+
+    async def take(self, session_id: int, depth: int, trait_focus: str, previous_choices: list):
+        """(scenario, prompt_version) of the matching candidate, None on a miss"""
+        if not self.enabled or not previous_choices:
+            return None
+
+        key = (session_id, depth, previous_choices[-1])
+        previous_choices = tuple(previous_choices)
+        candidate = self._candidates.get(key)
+        if candidate is None and key in self._in_flight:
+            in_flight_focus, in_flight_choices, task = self._in_flight[key]
+            if in_flight_focus == trait_focus and in_flight_choices == previous_choices:
+                # Still generating, waiting for it beats starting over
+                try:
+                    candidate = await asyncio.shield(task)
+                except asyncio.CancelledError:
+                    # Discarded by a concurrent request, not this request being cancelled
+                    if not task.cancelled():
+                        raise
+                    candidate = None
+                if candidate is not None:
+                    self._joined += 1
+
+        if candidate is None or not candidate.matches(trait_focus, previous_choices):
+            self._misses += 1
+            self._discard(session_id, depth)
+            return None
+
+        self._hits += 1
+        self._candidates.invalidate(key)
+        self._discard(session_id, depth)
+        return candidate.scenario, candidate.prompt_version
+
+    def _discard(self, session_id: int, depth: int):
+        """Drop the candidates for the choices that were not taken"""
+        def not_taken(key, candidate):
+            if key[:2] != (session_id, depth):
+                return False
+            self._tokens_wasted += candidate.tokens
+            return True
+
+        self._wasted += self._candidates.invalidate_where(not_taken)
+        for key in [key for key in self._in_flight if key[:2] == (session_id, depth)]:
+            self._in_flight.pop(key)[2].cancel()
+            self._wasted += 1
+
+    def stats(self):
+        self._expire_spent()
+        served = self._hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "max_in_flight": self.max_in_flight,
+            "max_tokens_per_minute": self.max_tokens_per_minute,
+            "in_flight": len(self._in_flight),
+            "candidates": len(self._candidates),
+            "scheduled": self._scheduled,
+            "throttled": self._throttled,
+            "failed": self._failed,
+            "hits": self._hits,
+            "joined_in_flight": self._joined,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / served, 4) if served else 0.0,
+            "wasted": self._wasted,
+            "tokens_last_minute": self._window_tokens,
+            "tokens": self._tokens,
+            "tokens_wasted": self._tokens_wasted
+        }
@@ -0,0 +1,62 @@
+"""
+Incremental parsing of a scenario JSON document while it is being streamed.
+
+The LLM writes the scenario as one JSON object. PartialScenarioParser is fed
+the text as it arrives and returns each `scene_narrative` entry and each
+choice as soon as its closing brace has been seen, without waiting for the
+rest of the document.
+"""
+import json
+
+# Top-level keys whose array items are emitted one by one
+STREAMED_ARRAYS = {"scene_narrative": "narrative", "choices": "choice"}
+
+class PartialScenarioParser:
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = None
+        self._last_string = None  # last complete string at the top level, a key candidate
+        self._key = None  # top-level key whose value is being read
+        self._item_start = None
+
+    def feed(self, chunk: str):
+        """Add text, returns [(event, item)] for the items completed by it"""
+        self.text += chunk
+        events = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = text[self._string_start + 1:i]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char == ":" and self._depth == 1:
+                self._key = self._last_string
+            elif char in "{[":
+                self._depth += 1
+                if char == "{" and self._depth == 3 and self._key in STREAMED_ARRAYS:
+                    self._item_start = i
+            elif char in "}]":
+                if char == "}" and self._depth == 3 and self._item_start is not None:
+                    try:
+                        events.append((STREAMED_ARRAYS[self._key], json.loads(text[self._item_start:i + 1])))
+                    except ValueError:
+                        pass
+                    self._item_start = None
+                self._depth -= 1
+        self._pos = len(text)
+        return events
@@ -0,0 +1,169 @@
+"""
+Pool of ready-made grow scenarios per (depth, trait_focus).
+
+A background task keeps WARM_POOL_TARGET scenarios generated for a generic
+player for every depth and trait focus. When a generation request runs past
+its latency budget (or the LLM call fails), the generate endpoint serves a
+pooled scenario instead of making the player wait, and the pool is refilled
+asynchronously.
+
+Pooled scenarios are generic, so the registered personalization hooks get to
+adjust each one for the player it is served to. Entries older than
+WARM_POOL_TTL are dropped, so prompt updates reach the pool within one TTL.
+
+Filling the pool spends LLM calls with nobody waiting, so it is off by
+default.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+
+WARM_POOL_ENABLED = os.getenv("WARM_POOL_ENABLED", "0") == "1"
+# Scenarios kept ready per (depth, trait_focus)
+WARM_POOL_TARGET = int(os.getenv("WARM_POOL_TARGET", "3"))
+WARM_POOL_TTL = float(os.getenv("WARM_POOL_TTL", "1800"))
+WARM_POOL_TRAITS = [t.strip() for t in os.getenv("WARM_POOL_TRAITS", "bravery,honesty,curiosity,empathy,patience").split(",") if t.strip()]
+# Pool generations running at once
+WARM_POOL_REFILL_CONCURRENCY = int(os.getenv("WARM_POOL_REFILL_CONCURRENCY", "2"))
+# Seconds between refill rounds when nothing was taken
+WARM_POOL_REFILL_INTERVAL = float(os.getenv("WARM_POOL_REFILL_INTERVAL", "30"))
+# Seconds a generate request waits for the LLM before a pooled scenario is served
+WARM_POOL_LATENCY_BUDGET = float(os.getenv("WARM_POOL_LATENCY_BUDGET", "8"))
+
+class PooledScenario:
+    __slots__ = ("scenario", "prompt_version", "created_at")
+
+    def __init__(self, scenario: dict, prompt_version: str, created_at: float):
+        self.scenario = scenario
+        self.prompt_version = prompt_version
+        self.created_at = created_at
+
+class WarmPool:
+    def __init__(self, generate, depths, traits=WARM_POOL_TRAITS, enabled: bool = WARM_POOL_ENABLED,
+                 target: int = WARM_POOL_TARGET, ttl: float = WARM_POOL_TTL,
+                 refill_concurrency: int = WARM_POOL_REFILL_CONCURRENCY,
+                 refill_interval: float = WARM_POOL_REFILL_INTERVAL):
+        # generate(depth, trait_focus) -> (scenario, prompt_version)
+        self._generate = generate
+        self.depths = list(depths)
+        self.traits = list(traits)
+        self.enabled = enabled
+        self.target = target
+        self.ttl = ttl
+        self.refill_concurrency = refill_concurrency
+        self.refill_interval = refill_interval
+
+        self._pools = {(depth, trait): deque() for depth in self.depths for trait in self.traits}
+        self._personalizers = []
+        # Created lazily, they must bind to the running loop
+        self._wakeup = None
+        self._task = None
+
+        # Metrics
+        self._served = 0
+        self._empty = 0
+        self._expired = 0
+        self._generated = 0
+        self._failed = 0
+        self._served_at = deque()  # serve times within the last minute
+
+    def add_personalizer(self, hook):
+        """hook(scenario, user_data) -> scenario, applied to every scenario served from the pool"""
+        self._personalizers.append(hook)
+
+    def _prune(self, pool: deque, now: float):
+        while pool and now - pool[0].created_at > self.ttl:
+            pool.popleft()
+            self._expired += 1
+
+    def take(self, depth: int, trait_focus: str, user_data: dict):
+        """(scenario, prompt_version) personalized for the player, None if the pool is empty"""
+        pool = self._pools.get((depth, trait_focus))
+        if not self.enabled or pool is None:
+            return None
+
+        now = time.monotonic()
+        self._prune(pool, now)
+        if not pool:
+            self._empty += 1
+            return None
+
+        entry = pool.popleft()
+        self._served += 1
+        self._served_at.append(now)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+        scenario = entry.scenario
+        for hook in self._personalizers:
+            scenario = hook(scenario, user_data)
+        return scenario, entry.prompt_version
+
+    async def _fill(self, key, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            try:
+                scenario, prompt_version = await self._generate(*key)
+            except Exception as e:
+                self._failed += 1
+                print(f"Warm pool generation failed for {key}: {e}")
+                return
+        self._pools[key].append(PooledScenario(scenario, prompt_version, time.monotonic()))
+        self._generated += 1
+
+    async def refill(self):
+        """Generate what is missing to bring every pool back to its target size"""
+        now = time.monotonic()
+        semaphore = asyncio.Semaphore(self.refill_concurrency)
+        fills = []
+        for key, pool in self._pools.items():
+            self._prune(pool, now)
+            fills.extend(self._fill(key, semaphore) for _ in range(self.target - len(pool)))
+        if fills:
+            await asyncio.gather(*fills)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.refill()
+            except Exception as e:
+                print(f"Warm pool refill failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        now = time.monotonic()
+        while self._served_at and now - self._served_at[0] > 60:
+            self._served_at.popleft()
+        ready = {f"{depth}:{trait}": len(pool) for (depth, trait), pool in self._pools.items()}
+        return {
+            "enabled": self.enabled,
+            "target": self.target,
+            "ttl": self.ttl,
+            "ready": sum(ready.values()),
+            "capacity": self.target * len(self._pools),
+            "ready_by_key": ready,
+            "served": self._served,
+            "empty": self._empty,
+            "drain_per_minute": len(self._served_at),
+            "expired": self._expired,
+            "generated": self._generated,
+            "failed": self._failed
+        }
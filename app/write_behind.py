@@ -0,0 +1,201 @@
+"""
+Write-behind buffer for trait deltas and games_played increments.
+
+Every learn choice and every finished session used to write user_info right
+away. Instead, deltas are summed per user in memory and written in batched
+multi-row statements every WRITE_BEHIND_FLUSH_INTERVAL seconds, or sooner
+once WRITE_BEHIND_MAX_USERS users have pending changes. The buffer is
+flushed on shutdown, so a crash loses at most one interval of changes; set
+WRITE_BEHIND_ENABLED=0 to write through instead.
+
+Changes are only buffered once the request's transaction has committed, and
+readers of user_info (see overlay) add the pending deltas on top: the
+authenticated user (get_current_active_user, which grow personalization and
+/users/me use), /users/{id}, the game summary and /analytics/user stats.
+Aggregates over many users (the leaderboard) read user_info as stored and
+can lag by up to one flush interval.
+
+Deltas are summed per trait and the total is clamped to 0-100 once, when it
+is written. Writing them one by one clamped after every step, so mixed-sign
+sequences can end differently: at 95, +10 then -10 now leaves 95 where it
+used to leave 90. Overwriting a profile (UserCRUD.update_user) drops the
+user's pending deltas, they were relative to the old values.
+"""
+import asyncio
+import os
+import time
+from database import after_commit
+from async_crud import UserCRUD
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "1") == "1"
+# Upper bound on how long a change can sit in memory (the loss window on a crash)
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "1.0"))
+# Flush early once this many users have pending changes
+WRITE_BEHIND_MAX_USERS = int(os.getenv("WRITE_BEHIND_MAX_USERS", "1000"))
+
+class WriteBehindBuffer:
+    def __init__(self, flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL, max_users: int = WRITE_BEHIND_MAX_USERS):
+        self.flush_interval = flush_interval
+        self.max_users = max_users
+
+        self._trait_deltas = {}  # user_id -> {trait: delta}
+        self._games_played = {}  # user_id -> games
+        # Changes being written by the current flush, still visible to readers
+        self._flushing = ({}, {})
+        # Created lazily, they must bind to the running loop
+        self._flush_lock = None
+        self._task = None
+        self._early_flush = None
+
+        # Metrics
+        self._buffered = 0
+        self._flushes = 0
+        self._flushed_users = 0
+        self._failed_flushes = 0
+        self._last_flush_ms = 0.0
+
+    def add_trait_deltas(self, user_id: int, deltas: dict):
+        self._merge_trait_deltas(user_id, deltas)
+        self._buffered += 1
+        self._maybe_flush()
+
+    def increment_games_played(self, user_id: int, games: int = 1):
+        self._games_played[user_id] = self._games_played.get(user_id, 0) + games
+        self._buffered += 1
+        self._maybe_flush()
+
+    def _merge_trait_deltas(self, user_id: int, deltas: dict):
+        pending = self._trait_deltas.setdefault(user_id, {})
+        for trait, delta in deltas.items():
+            pending[trait] = pending.get(trait, 0) + delta
+
+    def pending(self, user_id: int):
+        """(trait deltas, games) not written yet for a user"""
+        deltas = {}
+        games = 0
+        for trait_deltas, games_played in (self._flushing, (self._trait_deltas, self._games_played)):
+            for trait, delta in trait_deltas.get(user_id, {}).items():
+                deltas[trait] = deltas.get(trait, 0) + delta
+            games += games_played.get(user_id, 0)
+        return deltas, games
+
+    async def discard_trait_deltas(self, user_id: int):
+        """Drop a user's pending trait deltas before its trait_profile is overwritten"""
+        self._trait_deltas.pop(user_id, None)
+        if user_id in self._flushing[0]:
+            # Let the flush in progress write first, or it would land on top of the new profile
+            async with self._flush_lock:
+                pass
+            self._trait_deltas.pop(user_id, None)
+
+    def _pending_users(self):
+        return len(self._trait_deltas.keys() | self._games_played.keys())
+
+    def _maybe_flush(self):
+        # One early flush at a time, it takes everything pending when it starts
+        if self._early_flush is not None and not self._early_flush.done():
+            return
+        if self._pending_users() >= self.max_users:
+            self._early_flush = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            # Swap the buffers first so changes made while flushing wait for the next round
+            trait_deltas, self._trait_deltas = self._trait_deltas, {}
+            games_played, self._games_played = self._games_played, {}
+            if not trait_deltas and not games_played:
+                return
+
+            self._flushing = (trait_deltas, games_played)
+            users = len(trait_deltas.keys() | games_played.keys())
+            start = time.perf_counter()
+            try:
+                if trait_deltas:
+                    await UserCRUD.apply_trait_deltas_batch(trait_deltas)
+                    # Written, don't apply them again if the counters fail
+                    trait_deltas = {}
+                    self._flushing = (trait_deltas, games_played)
+                if games_played:
+                    await UserCRUD.increment_games_played_batch(games_played)
+            except Exception as e:
+                # Put the changes back, they are retried on the next flush
+                for user_id, deltas in trait_deltas.items():
+                    self._merge_trait_deltas(user_id, deltas)
+                for user_id, games in games_played.items():
+                    self._games_played[user_id] = self._games_played.get(user_id, 0) + games
+                self._failed_flushes += 1
+                print(f"Write-behind flush failed, will retry: {e}")
+                return
+            finally:
+                self._flushing = ({}, {})
+
+            self._flushes += 1
+            self._flushed_users += users
+            self._last_flush_ms = (time.perf_counter() - start) * 1000
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush and write whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self):
+        return {
+            "enabled": WRITE_BEHIND_ENABLED,
+            "flush_interval": self.flush_interval,
+            "max_users": self.max_users,
+            "pending_users": self._pending_users(),
+            "buffered": self._buffered,
+            "flushes": self._flushes,
+            "flushed_users": self._flushed_users,
+            "failed_flushes": self._failed_flushes,
+            "last_flush_ms": round(self._last_flush_ms, 3)
+        }
+
+write_buffer = WriteBehindBuffer()
+
+async def add_trait_deltas(user_id: int, deltas: dict):
+    """Buffer trait deltas once the current transaction commits (or write them through)"""
+    if not WRITE_BEHIND_ENABLED:
+        await UserCRUD.apply_trait_deltas(user_id, deltas)
+        return
+    after_commit(lambda: write_buffer.add_trait_deltas(user_id, deltas))
+
+async def increment_games_played(user_id: int):
+    if not WRITE_BEHIND_ENABLED:
+        await UserCRUD.increment_games_played(user_id)
+        return
+    after_commit(lambda: write_buffer.increment_games_played(user_id))
+
+def overlay(user: dict):
+    """Copy of a user_info row with its pending trait deltas and games applied"""
+    deltas, games = write_buffer.pending(user["userid"])
+    if not deltas and not games:
+        return user
+
+    user = dict(user)
+    if deltas and user.get("trait_profile"):
+        shift = deltas.get("*", 0)
+        user["trait_profile"] = {
+            trait: max(0, min(100, value + deltas.get(trait, 0) + shift))
+            for trait, value in user["trait_profile"].items()
+        }
+    user["game_played"] = user.get("game_played", 0) + games
+    return user
@@ -255,7 +255,7 @@ def learn_game_page():
         # Get starting scenario
         response = make_request(
             "GET",
-            f"/learn/scenario/{st.session_state.session_id}/start",
+            f"/learn/scenario/{st.session_state.session_id}/start?pruned=true",
             token=st.session_state.token
         )
         
@@ -310,29 +310,19 @@ def learn_game_page():
                 f"{choice['choice_id']}: {choice['choice_text']}",
                 help=f"Affects {trait_info.get('trait', 'unknown')} ({trait_info.get('degree', 'unknown')})"
             ):
-                # Record choice
-                make_request(
+                # Record choice and get next scenario in one call
+                response = make_request(
                     "POST",
-                    f"/learn/choice/{st.session_state.session_id}",
+                    f"/learn/step/{st.session_state.session_id}",
                     {
-                        "depth": scenario["depth"],
-                        "choice_id": choice["choice_id"],
-                        "trait_impact": trait_info.get("degree", "moderate")
+                        "path": st.session_state.current_path,
+                        "choice_id": choice["choice_id"]
                     },
                     token=st.session_state.token
                 )
                 
-                # Update path and get next scenario
-                st.session_state.current_path += choice["choice_id"]
-                
-                response = make_request(
-                    "POST",
-                    f"/learn/scenario/{st.session_state.session_id}/by-path",
-                    {"path": st.session_state.current_path},
-                    token=st.session_state.token
-                )
-                
                 if response and response.status_code == 200:
+                    st.session_state.current_path += choice["choice_id"]
                     st.session_state.current_scenario = response.json()
                     st.rerun()
 